@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from backend.replicas import use_primary
+from users.models import CustomUser
+
+from .cache import get_cache, get_generations
+
+TOKEN_KEY = 'auth-token:{}'
+# Поля, которые попадают в кэш. Разрешениям и представлениям нужны id и
+# признаки доступа; остальные поля, в том числе хэш пароля, загружаются из
+# основной БД одним запросом при первом обращении к любому из них.
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+TOKEN_FIELDS = ('key', 'user_id', 'created')
+
+
+def auth_scope(user_id):
+    return f'auth:{user_id}'
+
+
+class LocalTokenCache:
+    """LRU-кэш токенов в памяти процесса."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalTokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def rebuild(model, values):
+    """Экземпляр ``model`` из словаря полей; остальные поля отложены."""
+    fields = model._meta.concrete_fields
+    return model.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields],
+        [values.get(field.attname, DEFERRED) for field in fields],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД на каждый запрос.
+
+    Поля USER_FIELDS пользователя и токен хранятся в памяти процесса и в
+    общем кэше не дольше AUTH_TOKEN_CACHE_TTL секунд вместе с поколением
+    области ``auth:<id пользователя>``. Поколение меняется после фиксации
+    удаления токена и любого сохранения пользователя, кроме отметки
+    last_login, поэтому выход, блокировка и смена пароля действуют сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        shared_key = TOKEN_KEY.format(
+            hashlib.sha256(key.encode()).hexdigest())
+        entry = local_tokens.get(key)
+        if entry is None or not self.is_fresh(entry):
+            entry = get_cache().get(shared_key)
+            if entry is None or not self.is_fresh(entry):
+                entry = self.load(key, shared_key)
+            local_tokens.set(key, entry)
+        user_values, token_values, _, _ = entry
+        # Каждый запрос получает свои объекты: представления могут менять
+        # request.user. Остальные поля отложены, и сохранение такого
+        # пользователя записывает только загруженные поля.
+        user = rebuild(CustomUser, user_values)
+        token = rebuild(Token, token_values)
+        token.user = user
+        return user, token
+
+    def is_fresh(self, entry):
+        user_values, _, generation, expires = entry
+        return (expires > time.time()
+                and get_generations(auth_scope(user_values['id']))[0]
+                == generation)
+
+    def load(self, key, shared_key):
+        # Реплика может еще не знать новый токен или изменения пользователя,
+        # которые уже сменили поколение.
+        with use_primary():
+            user, token = super().authenticate_credentials(key)
+        # Поколение читается после пользователя: изменение, зафиксированное
+        # между двумя чтениями, сменит поколение уже после записи в кэш.
+        [generation] = get_generations(auth_scope(user.pk))
+        timeout = settings.AUTH_TOKEN_CACHE_TTL
+        entry = (
+            {field: getattr(user, field) for field in USER_FIELDS},
+            {field: getattr(token, field) for field in TOKEN_FIELDS},
+            generation,
+            time.time() + timeout,
+        )
+        get_cache().set(shared_key, entry, timeout)
+        return entry
@@ -0,0 +1,199 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from backend.replicas import current_replica
+
+GENERATION_KEY = 'generation:{}'
+MODIFIED_KEY = 'modified:{}'
+RESPONSE_KEY = 'response:{scope}:{generations}:{request}'
+PROCESS_LOCAL_WARNING = (
+    'Кэш API хранится в памяти процесса: запущенные серверы не увидят '
+    'сброса и будут отдавать прежние ответы до перезапуска или истечения '
+    'срока хранения в кэше.')
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def is_process_local():
+    """Хранит ли каждый процесс кэш API у себя, как LocMemCache."""
+    return (settings.CACHES[settings.API_CACHE_ALIAS]['BACKEND']
+            in settings.PROCESS_LOCAL_CACHES)
+
+
+def get_generations(*scopes):
+    """Возвращает текущие номера поколений для областей ``scopes``.
+
+    Номер поколения меняется при каждой записи в соответствующие таблицы,
+    поэтому ключи, в которые он входит, устаревают без перебора кэша.
+    """
+    cache = get_cache()
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def get_modified(*scopes):
+    """Возвращает время последней записи в области ``scopes``."""
+    cache = get_cache()
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    modified = cache.get_many(keys)
+    for key in keys:
+        if key not in modified:
+            cache.add(key, int(time.time()), None)
+            modified[key] = cache.get(key)
+    return max(modified.values(), default=None)
+
+
+def may_be_stale(*scopes):
+    """Могла ли реплика, из которой читает запрос, еще не получить
+    последние изменения областей ``scopes``.
+
+    Такие данные не кэшируются под текущими поколениями: иначе устаревший
+    ответ жил бы до следующего изменения.
+    """
+    if current_replica() is None:
+        return False
+    return (time.time() - (get_modified(*scopes) or 0)
+            < settings.DATABASE_REPLICA_LAG)
+
+
+def bump_generations(*scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    now = int(time.time())
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def normalize_query(query_params):
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params)
+        for value in sorted(query_params.getlist(key))
+    )
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы list и retrieve для анонимных пользователей.
+
+    Ключ строится из поколений областей ``get_cache_scopes`` (по умолчанию
+    ``cache_scopes``) и нормализованной строки запроса; запись в любую из
+    областей делает старые ответы недостижимыми. Если области вернули
+    None, ответ не кэшируется.
+    """
+
+    cache_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.render_list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.render_retrieve, request, *args, **kwargs)
+
+    def get_cache_scopes(self, request, *args, **kwargs):
+        return self.cache_scopes
+
+    def render_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def render_retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        scopes = self.get_cache_scopes(request, *args, **kwargs)
+        if scopes is None:
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        # Путь и строка запроса хэшируются: memcached не принимает ключи
+        # длиннее 250 байт и с пробелами.
+        key = RESPONSE_KEY.format(
+            scope=self.basename,
+            generations='.'.join(map(str, get_generations(*scopes))),
+            request=hashlib.md5(':'.join((
+                self.action,
+                request.get_host(),
+                request.path,
+                normalize_query(request.query_params),
+            )).encode()).hexdigest(),
+        )
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and not may_be_stale(*scopes):
+            cache.set(key, response.data)
+        return response
+
+
+class ConditionalGetMixin:
+    """Добавляет ETag и Last-Modified к ответам list и retrieve.
+
+    Валидаторы вычисляются по поколениям областей ``get_cache_scopes`` и
+    отметок текущего пользователя, поэтому на совпавший If-None-Match
+    ответ 304 отдается без сериализации.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_condition_scopes(self, request, *args, **kwargs):
+        scopes = self.get_cache_scopes(request, *args, **kwargs)
+        if scopes is None or not request.user.is_authenticated:
+            return scopes
+        return [*scopes, f'overlay:{request.user.pk}']
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        scopes = self.get_condition_scopes(request, *args, **kwargs)
+        if scopes is None:
+            return handler(request, *args, **kwargs)
+        etag = quote_etag(hashlib.md5(':'.join((
+            request.get_host(),
+            request.path,
+            normalize_query(request.query_params),
+            str(request.user.pk),
+            *map(str, get_generations(*scopes)),
+        )).encode()).hexdigest())
+        last_modified = max(filter(None, (
+            get_modified(*scopes),
+            self.get_last_modified(request, *args, **kwargs),
+        )))
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 304 or (
+                response.status_code == 200 and not may_be_stale(*scopes)):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
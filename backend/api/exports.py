@@ -0,0 +1,149 @@
+import csv
+import json
+from collections import namedtuple
+from itertools import groupby
+from operator import attrgetter
+
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCartTotal
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+CSV_HEADER = ('Ingredient', 'Amount', 'Unit')
+
+Item = namedtuple('Item', ('name', 'measurement_unit', 'amount', 'recipes'))
+
+
+def get_cart_items(user, group=None, recipes=False):
+    """Итоги по ингредиентам корзины, прочитанные курсором на сервере.
+
+    Без ``recipes`` итоги читаются из ShoppingCartTotal одним запросом.
+    С ``recipes`` читаются строки по парам «ингредиент — рецепт», которые
+    идут подряд для каждого ингредиента, поэтому суммы считаются на лету,
+    а в памяти держится только текущий ингредиент.
+    """
+    ordering = ['ingredient__name', 'ingredient__measurement_unit']
+    if group == 'unit':
+        ordering.insert(0, 'ingredient__measurement_unit')
+    if not recipes:
+        rows = ShoppingCartTotal.objects.filter(user=user).values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount',
+        ).order_by(*ordering)
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            yield Item(row['ingredient__name'],
+                       row['ingredient__measurement_unit'],
+                       row['amount'], None)
+        return
+    rows = RecipeIngredient.objects.filter(
+        recipe__in_shopping_lists__user=user,
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        'recipe_id', 'recipe__name',
+    ).annotate(amount=Sum('amount')).order_by(
+        *ordering, 'recipe__name', 'recipe_id')
+    for (name, unit), ingredient_rows in groupby(
+            rows.iterator(chunk_size=CHUNK_SIZE),
+            key=lambda row: (row['ingredient__name'],
+                             row['ingredient__measurement_unit'])):
+        breakdown = [(row['recipe__name'], row['amount'])
+                     for row in ingredient_rows]
+        yield Item(name, unit, sum(amount for _, amount in breakdown),
+                   breakdown)
+
+
+def group_items(items, group):
+    if group == 'unit':
+        return groupby(items, key=attrgetter('measurement_unit'))
+    return ((None, items),)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def write_csv(items, group=None, recipes=False):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER + (('Recipes',) if recipes else ()))
+    for item in items:
+        row = [item.name, item.amount, item.measurement_unit]
+        if recipes:
+            row.append('; '.join(
+                f'{name} ({amount})' for name, amount in item.recipes))
+        yield writer.writerow(row)
+
+
+def write_txt(items, group=None, recipes=False):
+    yield 'Список покупок\n'
+    for unit, unit_items in group_items(items, group):
+        if unit is not None:
+            yield f'\n{unit}:\n'
+        for item in unit_items:
+            yield f'- {item.name} ({item.measurement_unit}) — {item.amount}\n'
+            for name, amount in item.recipes or ():
+                yield f'    {name}: {amount}\n'
+
+
+def dump(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_array(elements):
+    yield '['
+    for index, element in enumerate(elements):
+        if index:
+            yield ','
+        yield from element
+    yield ']'
+
+
+def json_item(item):
+    data = {
+        'name': item.name,
+        'measurement_unit': item.measurement_unit,
+        'amount': item.amount,
+    }
+    if item.recipes is not None:
+        data['recipes'] = [{'name': name, 'amount': amount}
+                           for name, amount in item.recipes]
+    yield dump(data)
+
+
+def json_unit(unit, unit_items):
+    yield f'{{"measurement_unit":{dump(unit)},"ingredients":'
+    yield from json_array(json_item(item) for item in unit_items)
+    yield '}'
+
+
+def write_json(items, group=None, recipes=False):
+    if group == 'unit':
+        return json_array(json_unit(unit, unit_items)
+                          for unit, unit_items in group_items(items, group))
+    return json_array(json_item(item) for item in items)
+
+
+WRITERS = {
+    'csv': write_csv,
+    'txt': write_txt,
+    'json': write_json,
+}
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Склеивает мелкие куски в блоки примерно по ``size`` символов."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_shopping_cart(user, export_format, group=None, recipes=False):
+    """Генератор выгрузки корзины в формате csv, txt или json."""
+    items = get_cart_items(user, group, recipes)
+    return buffered(WRITERS[export_format](items, group, recipes))
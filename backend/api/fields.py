@@ -0,0 +1,101 @@
+import base64
+import binascii
+import re
+import uuid
+
+import filetype
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+BASE64_MARKER = ';base64,'
+# Маркер ищется только в начале строки, где стоит заголовок data URI.
+HEADER_LENGTH = 256
+# Кратно 4, чтобы части декодировались независимо.
+CHUNK_SIZE = 64 * 1024
+# Столько байт нужно filetype, чтобы определить формат.
+SIGNATURE_SIZE = 262
+WHITESPACE = re.compile(r'\s+')
+
+
+class DecodedImage(TemporaryUploadedFile):
+    """Временный файл с изображением из base64.
+
+    Хранилище переносит временный файл на место вместо копирования, поэтому
+    он закрывается вместе с объектом: close() учитывает, что файла на
+    прежнем месте уже нет.
+    """
+
+    def __del__(self):
+        self.close()
+
+
+class ImageUploadField(Base64ImageField):
+    """Изображение файлом из multipart/form-data или строкой base64.
+
+    Размер и формат проверяются до обработки всего файла. Файл из формы
+    Django уже записал во временный файл, а строка base64 декодируется
+    во временный файл частями, без второй копии в памяти.
+    """
+
+    INVALID_FILE_MESSAGE = 'Загрузите корректное изображение.'
+    INVALID_TYPE_MESSAGE = ('Допустимые форматы изображений: jpeg, png, '
+                            'gif, webp.')
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'not_image': 'Передайте файл или строку base64.',
+        'invalid_image': INVALID_FILE_MESSAGE,
+    }
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif isinstance(data, UploadedFile):
+            self.check_size(data.size)
+            data.name = self.get_name(data.read(SIGNATURE_SIZE))
+            data.seek(0)
+        else:
+            self.fail('not_image')
+        return serializers.ImageField.to_internal_value(self, data)
+
+    def check_size(self, size):
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=format(
+                settings.IMAGE_UPLOAD_MAX_SIZE / 1024 / 1024, '.3g'))
+
+    def get_name(self, signature):
+        extension = filetype.guess_extension(signature)
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return f'{self.get_file_name(signature)}.{extension}'
+
+    def decode(self, data):
+        start = data.find(BASE64_MARKER, 0, HEADER_LENGTH)
+        start = 0 if start == -1 else start + len(BASE64_MARKER)
+        self.check_size((len(data) - start) * 3 // 4)
+        upload = DecodedImage(f'{uuid.uuid4()}', None, 0, None)
+        try:
+            tail = b''
+            for position in range(start, len(data), CHUNK_SIZE):
+                chunk = tail + WHITESPACE.sub(
+                    '', data[position:position + CHUNK_SIZE]).encode('ascii')
+                usable = len(chunk) - len(chunk) % 4
+                chunk, tail = chunk[:usable], chunk[usable:]
+                decoded = base64.b64decode(chunk, validate=True)
+                if decoded and not upload.tell():
+                    upload.name = self.get_name(decoded[:SIGNATURE_SIZE])
+                upload.write(decoded)
+            if tail or not upload.tell():
+                raise ValueError
+        except (binascii.Error, UnicodeEncodeError, ValueError):
+            upload.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        except serializers.ValidationError:
+            upload.close()
+            raise
+        upload.size = upload.tell()
+        upload.seek(0)
+        return upload
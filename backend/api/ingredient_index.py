@@ -0,0 +1,95 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count
+
+from backend.replicas import use_primary
+from recipes.models import Ingredient, RecipeIngredient
+
+from .cache import get_generations
+
+MAX_CHAR = chr(0x10FFFF)
+
+Entry = namedtuple(
+    'Entry', ('key', 'id', 'name', 'measurement_unit', 'popularity'))
+Snapshot = namedtuple(
+    'Snapshot', ('generation', 'built_at', 'keys', 'entries'))
+
+
+class IngredientIndex:
+    """Индекс префиксов названий ингредиентов в памяти процесса.
+
+    Названия хранятся в отсортированном массиве в регистронезависимом
+    виде, поиск по префиксу — два двоичных поиска. Индекс строится при
+    первом обращении и перестраивается, когда меняется поколение таблицы
+    ингредиентов или устаревает популярность
+    (INGREDIENT_POPULARITY_TTL секунд).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+
+    def is_fresh(self, snapshot, generation):
+        return (
+            snapshot is not None
+            and snapshot.generation == generation
+            and time.monotonic() - snapshot.built_at
+            < settings.INGREDIENT_POPULARITY_TTL
+        )
+
+    def get_snapshot(self):
+        generation, = get_generations('ingredients')
+        snapshot = self.snapshot
+        if self.is_fresh(snapshot, generation):
+            return snapshot
+        with self.lock:
+            if not self.is_fresh(self.snapshot, generation):
+                # Индекс живет до следующего изменения ингредиентов и не
+                # должен собираться из отстающей реплики.
+                with use_primary():
+                    self.snapshot = self.build(generation)
+            return self.snapshot
+
+    def build(self, generation):
+        popularity = dict(
+            RecipeIngredient.objects.order_by().values('ingredient_id')
+            .annotate(count=Count('pk')).values_list('ingredient_id', 'count')
+        )
+        entries = sorted(
+            Entry(name.casefold(), pk, name, unit, popularity.get(pk, 0))
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        )
+        return Snapshot(
+            generation,
+            time.monotonic(),
+            [entry.key for entry in entries],
+            entries,
+        )
+
+    def search(self, prefix='', limit=None, by_popularity=False):
+        snapshot = self.get_snapshot()
+        prefix = prefix.casefold()
+        matches = snapshot.entries[
+            bisect_left(snapshot.keys, prefix):
+            bisect_left(snapshot.keys, prefix + MAX_CHAR)
+        ]
+        if by_popularity:
+            matches.sort(key=lambda entry: (-entry.popularity, entry.key))
+        else:
+            matches.sort(key=lambda entry: entry.id)
+        return [
+            {
+                'id': entry.id,
+                'name': entry.name,
+                'measurement_unit': entry.measurement_unit,
+            }
+            for entry in matches[:limit]
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,467 @@
+import json
+import os
+import random
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import URLResolver, get_resolver
+from rest_framework.authtoken.models import Token
+
+from api.cache import get_cache
+from backend.consts import PAGE_SIZE
+from recipes import short_links
+from recipes.ingredients import load_ingredients, read_ingredients
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from users.models import CustomUser, Subscribe
+
+BUDGETS_PATH = Path(__file__).resolve().parents[2] / 'query_budgets.json'
+INGREDIENTS_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+PASSWORD = 'benchmark-password'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa'
+    'AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQI'
+    'mWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+# Рецепты ссылаются на несуществующий файл; отметка о готовых вариантах
+# не дает фоновой обработке изображений искать его.
+IMAGE_NAME = 'recipes/images/benchmark.png'
+IMAGE_VARIANTS = {'source': IMAGE_NAME}
+ROLES = ('anonymous', 'authenticated')
+LARGE_PAGE = PAGE_SIZE * 5
+BATCH_SIZE = 1000
+MENU_SIZE = 7
+
+# Маршруты djoser для управления учетной записью требуют токенов из писем
+# и не участвуют в замерах.
+SKIPPED_ROUTES = {
+    'users-activation',
+    'users-resend-activation',
+    'users-reset-password',
+    'users-reset-password-confirm',
+    'users-reset-username',
+    'users-reset-username-confirm',
+    'users-set-username',
+}
+
+Scenario = namedtuple(
+    'Scenario', ('route', 'method', 'path', 'data', 'paginated'))
+
+SCENARIOS = (
+    Scenario('api-root', 'get', '/api/', None, False),
+    Scenario('recipes-list', 'get', '/api/recipes/', None, True),
+    Scenario('recipes-list', 'get', '/api/recipes/?tags={tag_slug}',
+             None, True),
+    Scenario('recipes-list', 'get', '/api/recipes/?cursor=', None, True),
+    Scenario('recipes-list', 'post', '/api/recipes/', 'recipe', False),
+    Scenario('recipes-detail', 'get', '/api/recipes/{recipe}/', None, False),
+    Scenario('recipes-detail', 'patch', '/api/recipes/{edited_recipe}/',
+             'recipe', False),
+    Scenario('recipes-detail', 'patch', '/api/recipes/{edited_recipe}/',
+             'rename', False),
+    Scenario('recipes-detail', 'delete', '/api/recipes/{own_recipe}/',
+             None, False),
+    Scenario('recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/',
+             None, False),
+    Scenario('recipes-favorite', 'delete',
+             '/api/recipes/{favorited}/favorite/', None, False),
+    Scenario('recipes-shopping-cart', 'post',
+             '/api/recipes/{recipe}/shopping_cart/', None, False),
+    Scenario('recipes-shopping-cart', 'delete',
+             '/api/recipes/{carted}/shopping_cart/', None, False),
+    Scenario('recipes-feed', 'get', '/api/recipes/feed/', None, True),
+    Scenario('recipes-feed', 'get', '/api/recipes/feed/?cursor=', None,
+             True),
+    Scenario('recipes-favorite-bulk', 'post', '/api/recipes/favorite/',
+             'menu', False),
+    Scenario('recipes-favorite-bulk', 'delete', '/api/recipes/favorite/',
+             'favorited_ids', False),
+    Scenario('recipes-shopping-cart-summary', 'get',
+             '/api/recipes/shopping_cart/', None, False),
+    Scenario('recipes-shopping-cart-summary', 'post',
+             '/api/recipes/shopping_cart/', 'menu', False),
+    Scenario('recipes-shopping-cart-summary', 'delete',
+             '/api/recipes/shopping_cart/', 'carted_ids', False),
+    Scenario('recipes-shopping-cart-clear', 'delete',
+             '/api/recipes/shopping_cart/clear/', None, False),
+    Scenario('recipes-download-shopping-cart', 'get',
+             '/api/recipes/download_shopping_cart/', None, False),
+    Scenario('recipes-download-shopping-cart', 'get',
+             '/api/recipes/download_shopping_cart/'
+             '?format=json&group=unit&recipes=true', None, False),
+    Scenario('recipes-get-link', 'get', '/api/recipes/{recipe}/get-link/',
+             None, False),
+    Scenario('s/<str:link>/', 'get', '/s/{short_link}/', None, False),
+    Scenario('tags-list', 'get', '/api/tags/', None, False),
+    Scenario('tags-detail', 'get', '/api/tags/{tag}/', None, False),
+    Scenario('ingredients-list', 'get', '/api/ingredients/', None, False),
+    Scenario('ingredients-list', 'get', '/api/ingredients/?name={prefix}',
+             None, False),
+    Scenario('ingredients-detail', 'get', '/api/ingredients/{ingredient}/',
+             None, False),
+    Scenario('users-list', 'get', '/api/users/', None, True),
+    Scenario('users-list', 'post', '/api/users/', 'user', False),
+    Scenario('users-detail', 'get', '/api/users/{author}/', None, False),
+    Scenario('users-me', 'get', '/api/users/me/', None, False),
+    Scenario('users-set-password', 'post', '/api/users/set_password/',
+             'password', False),
+    Scenario('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, True),
+    Scenario('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3&cursor=', None, True),
+    Scenario('users-subscribe', 'post', '/api/users/{author}/subscribe/',
+             None, False),
+    Scenario('users-subscribe', 'delete',
+             '/api/users/{followed}/subscribe/', None, False),
+    Scenario('users-update-avatar', 'put', '/api/users/me/avatar/',
+             'avatar', False),
+    Scenario('users-update-avatar', 'delete', '/api/users/me/avatar/',
+             None, False),
+    Scenario('login', 'post', '/api/auth/token/login/', 'login', False),
+    Scenario('logout', 'post', '/api/auth/token/logout/', None, False),
+)
+
+
+def collect_routes(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from collect_routes(pattern.url_patterns, route)
+        else:
+            yield route, pattern.name or route
+
+
+@contextmanager
+def seeded_database(options):
+    """Создает и заполняет тестовую БД, после замеров удаляет ее.
+
+    Возвращает контекст сценариев из ``seed_database``.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield seed_database(options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_database(options):
+    """Заполняет БД данными для замеров и возвращает контекст сценариев."""
+    rng = random.Random(options['seed'])
+    with open(INGREDIENTS_PATH, encoding='utf-8', newline='') as file:
+        load_ingredients(read_ingredients(file, 'csv'))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {index}', slug=f'tag-{index}')
+        for index in range(8))
+    tags = list(Tag.objects.all())
+
+    password = make_password(PASSWORD)
+    CustomUser.objects.bulk_create((
+        CustomUser(
+            email=f'user{index}@example.com',
+            username=f'user{index}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=password,
+        ) for index in range(options['users'])
+    ), batch_size=BATCH_SIZE)
+    user_ids = list(CustomUser.objects.values_list('id', flat=True))
+
+    Recipe.objects.bulk_create((
+        Recipe(
+            name=f'Рецепт {index}',
+            author_id=rng.choice(user_ids),
+            image=IMAGE_NAME,
+            text='Описание',
+            cooking_time=rng.randint(1, 180),
+        ) for index in range(options['recipes'])
+    ), batch_size=BATCH_SIZE)
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create((
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(ingredient_ids,
+                                        rng.randint(3, 10))
+    ), batch_size=BATCH_SIZE)
+    Recipe.tags.through.objects.bulk_create((
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+        for recipe_id in recipe_ids
+        for tag in rng.sample(tags, rng.randint(1, 3))
+    ), batch_size=BATCH_SIZE)
+    Subscribe.objects.bulk_create((
+        Subscribe(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rng.sample(user_ids, options['subscriptions'])
+        if author_id != user_id
+    ), batch_size=BATCH_SIZE)
+    for model, count in ((Favorite, options['favorites']),
+                         (ShoppingList, options['cart'])):
+        model.objects.bulk_create((
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in rng.sample(recipe_ids, count)
+        ), batch_size=BATCH_SIZE)
+    call_command('recount_counters', stdout=open(os.devnull, 'w'))
+
+    user = CustomUser.objects.get(id=user_ids[0])
+    other = Recipe.objects.exclude(author=user).exclude(
+        favorited_by__user=user).exclude(
+        in_shopping_lists__user=user).first()
+    # Состав изменяемого рецепта частично совпадает с составом из сценария
+    # изменения, поэтому PATCH добавляет, меняет и удаляет строки.
+    edited_recipe = Recipe.objects.create(
+        name='Изменяемый рецепт', author=user, cooking_time=10,
+        image=IMAGE_NAME, image_variants=IMAGE_VARIANTS)
+    edited_ingredients = [
+        {'id': ingredient_id, 'amount': amount}
+        for ingredient_id, amount in zip(ingredient_ids[2:6], (10, 10, 5, 7))
+    ]
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=edited_recipe, ingredient_id=item['id'],
+                         amount=item['amount'])
+        for item in edited_ingredients
+    )
+    ShoppingList.objects.create(user_id=user_ids[1], recipe=edited_recipe)
+    return {
+        'user': user,
+        'token': Token.objects.create(user=user).key,
+        'recipe': other.id,
+        'short_link': other.get_short_link(),
+        'own_recipe': Recipe.objects.create(
+            name='Свой рецепт', author=user, cooking_time=10,
+            image=IMAGE_NAME, image_variants=IMAGE_VARIANTS).id,
+        'edited_recipe': edited_recipe.id,
+        'edited_ingredients': edited_ingredients,
+        'favorited': user.favorites.values_list(
+            'recipe', flat=True).first(),
+        'carted': user.shopping_lists.values_list(
+            'recipe', flat=True).first(),
+        'menu': list(Recipe.objects.exclude(author=user).exclude(
+            favorited_by__user=user).exclude(
+            in_shopping_lists__user=user).values_list(
+            'id', flat=True)[:MENU_SIZE]),
+        'favorited_ids': list(user.favorites.values_list(
+            'recipe', flat=True)[:MENU_SIZE]),
+        'carted_ids': list(user.shopping_lists.values_list(
+            'recipe', flat=True)[:MENU_SIZE]),
+        'author': CustomUser.objects.exclude(id=user.id).exclude(
+            followers__user=user).first().id,
+        'followed': user.subscriptions.values_list(
+            'author', flat=True).first(),
+        'tag': tags[0].id,
+        'tag_slug': tags[0].slug,
+        'ingredient': ingredient_ids[0],
+        'ingredient_ids': ingredient_ids,
+        'prefix': Ingredient.objects.get(id=ingredient_ids[0]).name[:3],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую БД и замеряет число запросов, время БД и '
+            'общее время ответа для каждого маршрута API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH))
+        parser.add_argument('--update-budgets', action='store_true',
+                            help='Записать замеренные значения в бюджет.')
+        parser.add_argument('--output',
+                            help='Сохранить результаты замеров в JSON.')
+
+    def handle(self, *args, **options):
+        with seeded_database(options) as context:
+            results = self.run_scenarios(context)
+
+        self.report(results)
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(results, ensure_ascii=False, indent=2))
+        if options['update_budgets']:
+            self.write_budgets(results, options['budgets'])
+            return
+        failures = self.check_budgets(results, options['budgets'])
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены.'))
+
+    def payload(self, kind, context):
+        if kind == 'recipe':
+            return {
+                'ingredients': [{'id': ingredient_id, 'amount': 10}
+                                for ingredient_id
+                                in context['ingredient_ids'][:5]],
+                'tags': [context['tag']],
+                'image': IMAGE,
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 15,
+            }
+        if kind == 'rename':
+            return {
+                'ingredients': context['edited_ingredients'],
+                'tags': [context['tag']],
+                'image': IMAGE,
+                'name': 'Переименованный рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+            }
+        if kind == 'user':
+            return {
+                'email': 'new-user@example.com',
+                'username': 'new-user',
+                'first_name': 'Имя',
+                'last_name': 'Фамилия',
+                'password': PASSWORD,
+            }
+        if kind == 'password':
+            return {'current_password': PASSWORD,
+                    'new_password': 'new-benchmark-password'}
+        if kind == 'avatar':
+            return {'avatar': IMAGE}
+        if kind in ('menu', 'favorited_ids', 'carted_ids'):
+            return {'recipes': context[kind]}
+        if kind == 'login':
+            return {'email': context['user'].email, 'password': PASSWORD}
+        return None
+
+    def clear_caches(self):
+        get_cache().clear()
+        short_links.resolve_cached.cache_clear()
+
+    def measure(self, client, method, path, data):
+        with transaction.atomic(), \
+                CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(
+                path, data=json.dumps(data) if data is not None else None,
+                content_type='application/json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            wall = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return {
+            'status': response.status_code,
+            'queries': len(queries),
+            'db_ms': round(sum(float(query['time'])
+                               for query in queries) * 1000, 2),
+            'wall_ms': round(wall * 1000, 2),
+        }
+
+    def run_scenarios(self, context):
+        routes = {}
+        for route, name in collect_routes(get_resolver().url_patterns):
+            if not route.startswith('admin/') and '<format>' not in route:
+                routes.setdefault(route, name)
+        covered = {scenario.route for scenario in SCENARIOS}
+        missing = set(routes.values()) - covered - SKIPPED_ROUTES
+        if missing:
+            raise CommandError(
+                'Нет сценариев для маршрутов: ' + ', '.join(sorted(missing)))
+
+        clients = {
+            'anonymous': Client(raise_request_exception=False),
+            'authenticated': Client(
+                raise_request_exception=False,
+                HTTP_AUTHORIZATION=f'Token {context["token"]}'),
+        }
+        results = []
+        for scenario in SCENARIOS:
+            path = scenario.path.format(**context)
+            data = self.payload(scenario.data, context)
+            for role in ROLES:
+                self.clear_caches()
+                result = self.measure(
+                    clients[role], scenario.method, path, data)
+                if scenario.method == 'get':
+                    result['repeat_queries'] = self.measure(
+                        clients[role], scenario.method, path,
+                        data)['queries']
+                result.update(
+                    key=f'{scenario.method.upper()} {path}',
+                    route=scenario.route,
+                    method=scenario.method,
+                    role=role,
+                )
+                if scenario.paginated:
+                    separator = '&' if '?' in path else '?'
+                    self.clear_caches()
+                    result['large_page_queries'] = self.measure(
+                        clients[role], scenario.method,
+                        f'{path}{separator}limit={LARGE_PAGE}',
+                        data)['queries']
+                results.append(result)
+        return results
+
+    def report(self, results):
+        for result in results:
+            self.stdout.write(
+                '{role:<14} {key:<60} {status} queries={queries:<4} '
+                'repeat={repeat} db={db_ms}ms wall={wall_ms}ms'.format(
+                    repeat=result.get('repeat_queries', '-'), **result))
+
+    def budget_key(self, result):
+        return f'{result["method"].upper()} {result["route"]}'
+
+    def write_budgets(self, results, path):
+        path = Path(path)
+        previous = json.loads(path.read_text()) if path.exists() else {}
+        budgets = {
+            key: {'allow_growth': True}
+            for key, roles in previous.items() if roles.get('allow_growth')
+        }
+        for result in results:
+            roles = budgets.setdefault(self.budget_key(result), {})
+            roles[result['role']] = max(
+                roles.get(result['role'], 0), result['queries'])
+        path.write_text(json.dumps(
+            budgets, ensure_ascii=False, indent=2, sort_keys=True) + '\n')
+        self.stdout.write(f'Бюджеты записаны в {path}.')
+
+    def check_budgets(self, results, path):
+        budgets = json.loads(Path(path).read_text())
+        failures = []
+        for result in results:
+            key = self.budget_key(result)
+            allow_growth = budgets.get(key, {}).get('allow_growth', False)
+            if result['status'] >= 500:
+                failures.append(
+                    f'{result["key"]} ({result["role"]}): '
+                    f'ответ {result["status"]}.')
+            budget = budgets.get(key, {}).get(result['role'])
+            if budget is None:
+                failures.append(f'{key} ({result["role"]}): нет бюджета.')
+            elif result['queries'] > budget:
+                failures.append(
+                    f'{result["key"]} ({result["role"]}): '
+                    f'{result["queries"]} запросов при бюджете {budget}.')
+            large = result.get('large_page_queries')
+            if (large is not None and large != result['queries']
+                    and not allow_growth):
+                failures.append(
+                    f'{result["key"]} ({result["role"]}): число запросов '
+                    f'растет с размером страницы '
+                    f'({result["queries"]} -> {large}).')
+        return failures
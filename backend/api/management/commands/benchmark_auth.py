@@ -0,0 +1,130 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.authentication import auth_scope, local_tokens
+from api.cache import bump_generations, get_cache
+
+from .benchmark_api import PASSWORD, seeded_database
+
+PATHS = (
+    '/api/users/me/',
+    '/api/ingredients/?name={prefix}',
+    '/api/recipes/?limit=6',
+)
+TOKEN_TABLE = Token._meta.db_table
+
+
+class Command(BaseCommand):
+    help = ('Замеряет аутентификацию по токену с пустым и заполненным '
+            'кэшем токенов и проверяет сброс кэша при выходе, блокировке '
+            'и смене пароля.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with seeded_database({
+            'users': 50,
+            'recipes': 200,
+            'subscriptions': 5,
+            'favorites': 5,
+            'cart': 3,
+            'seed': options['seed'],
+        }) as context:
+            get_cache().clear()
+            local_tokens.clear()
+            self.compare(context, options['requests'])
+            self.check_invalidation(context)
+
+    def get_client(self, token):
+        return Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, client, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(
+                path, data=json.dumps(data) if data is not None else None,
+                content_type='application/json')
+            wall = time.perf_counter() - started
+        auth_queries = sum(
+            TOKEN_TABLE in query['sql'] for query in queries)
+        return response.status_code, auth_queries, len(queries), wall
+
+    def measure(self, client, path, repeat, before=None):
+        results = []
+        for _ in range(repeat):
+            if before:
+                before()
+            results.append(self.request(client, 'get', path))
+        statuses = {status for status, *_ in results}
+        if statuses != {200}:
+            raise CommandError(f'{path}: ответы {sorted(statuses)}.')
+        return (
+            max(auth for _, auth, _, _ in results),
+            max(total for _, _, total, _ in results),
+            statistics.median(wall for *_, wall in results) * 1000,
+        )
+
+    def compare(self, context, repeat):
+        client = self.get_client(context['token'])
+        scope = auth_scope(context['user'].pk)
+        for template in PATHS:
+            path = template.format(**context)
+            self.request(client, 'get', path)
+            # Смена поколения делает записи обоих кэшей устаревшими, и
+            # пользователь читается из БД, как в TokenAuthentication.
+            cold = self.measure(
+                client, path, repeat, lambda: bump_generations(scope))
+            self.request(client, 'get', path)
+            warm = self.measure(client, path, repeat)
+            for name, (auth, total, median) in (
+                    ('без кэша токенов', cold), ('с кэшем токенов', warm)):
+                self.stdout.write(
+                    f'{path:<36} {name:<18} запросов к токенам={auth} '
+                    f'всего={total:<3} медиана={median:.2f}ms')
+            if warm[0]:
+                raise CommandError(
+                    f'{path}: при заполненном кэше токен читается из БД.')
+        self.stdout.write(self.style.SUCCESS(
+            'При заполненном кэше запросов к таблице токенов нет.'))
+
+    def expect(self, name, result, status, auth_queries=None):
+        if result[0] != status or (
+                auth_queries is not None and result[1] != auth_queries):
+            raise CommandError(
+                f'{name}: ответ {result[0]}, запросов к токенам '
+                f'{result[1]}; ожидался ответ {status}.')
+        self.stdout.write(f'{name:<36} ответ {result[0]}')
+
+    def check_invalidation(self, context):
+        user = context['user']
+        me = '/api/users/me/'
+        client = self.get_client(context['token'])
+        self.expect('До выхода', self.request(client, 'get', me), 200, 0)
+        self.request(client, 'post', '/api/auth/token/logout/')
+        self.expect('После выхода', self.request(client, 'get', me), 401)
+
+        client = self.get_client(Token.objects.create(user=user).key)
+        self.request(client, 'get', me)
+        self.request(client, 'post', '/api/users/set_password/', {
+            'current_password': PASSWORD,
+            'new_password': 'changed-benchmark-password',
+        })
+        self.expect('После смены пароля',
+                    self.request(client, 'get', me), 200, 1)
+
+        user.refresh_from_db()
+        user.is_active = False
+        user.save()
+        self.expect('После блокировки', self.request(client, 'get', me), 401)
+        self.stdout.write(self.style.SUCCESS(
+            'Кэш токенов сбрасывается при выходе, смене пароля и '
+            'блокировке.'))
@@ -0,0 +1,105 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef, Prefetch
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.cache import get_cache
+from api.renderers import FastJSONRenderer
+from api.representations import render_recipes
+from api.serializers import RecipeSerializer
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import CustomUser, Subscribe
+
+from .benchmark_api import seeded_database
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает RecipeSerializer и быстрый путь чтения рецептов '
+            'на одном наборе данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with seeded_database({
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'subscriptions': 10,
+            'favorites': 20,
+            'cart': 5,
+            'seed': options['seed'],
+        }) as context:
+            self.compare(context['user'], options['recipes'],
+                         options['repeat'])
+
+    def get_request(self, user):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def annotated(self, user):
+        return Recipe.objects.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def serializer_path(self, user, limit):
+        recipes = self.annotated(user).prefetch_related(
+            Prefetch('author', queryset=CustomUser.objects.annotate(
+                is_subscribed=Exists(Subscribe.objects.filter(
+                    user=user, author=OuterRef('pk'))))),
+            'tags',
+            'recipeingredient_set__ingredient',
+        )[:limit]
+        data = RecipeSerializer(
+            recipes, many=True,
+            context={'request': self.get_request(user)}).data
+        return JSONRenderer().render(data)
+
+    def fast_path(self, user, limit):
+        recipes = self.annotated(user)[:limit]
+        return FastJSONRenderer().render(
+            render_recipes(recipes, self.get_request(user)))
+
+    def measure(self, handler, repeat, before=None):
+        timings = []
+        for _ in range(repeat):
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                content = handler()
+                timings.append(time.perf_counter() - started)
+        return content, len(queries), statistics.median(timings) * 1000
+
+    def compare(self, user, limit, repeat):
+        cache = get_cache()
+        results = (
+            ('RecipeSerializer', self.measure(
+                lambda: self.serializer_path(user, limit), repeat)),
+            ('быстрый путь, холодный кэш', self.measure(
+                lambda: self.fast_path(user, limit), repeat, cache.clear)),
+            ('быстрый путь, теплый кэш', self.measure(
+                lambda: self.fast_path(user, limit), repeat)),
+        )
+        for name, (content, queries, median) in results:
+            self.stdout.write(
+                f'{name:<28} рецептов={limit} запросов={queries:<3} '
+                f'медиана={median:.1f}ms размер={len(content)}')
+        reference = results[0][1][0]
+        if any(content != reference for _, (content, _, _) in results):
+            raise CommandError(
+                'Ответ быстрого пути отличается от RecipeSerializer.')
+        self.stdout.write(self.style.SUCCESS(
+            'Ответы совпадают байт в байт.'))
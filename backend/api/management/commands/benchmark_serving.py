@@ -0,0 +1,201 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from importlib.util import find_spec
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.authentication import local_tokens
+from api.cache import get_cache
+
+from .benchmark_api import seeded_database
+
+MODES = ('wsgi', 'asgi')
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/{recipe}/',
+    '/api/ingredients/?name={prefix}',
+    '/s/{short_link}/',
+)
+STARTUP_TIMEOUT = 30
+
+
+def memory_kb(pid):
+    """Пиковый RSS процесса и его потомков в КБ по данным /proc."""
+    total = 0
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    total += int(line.split()[1])
+        with open(f'/proc/{pid}/task/{pid}/children') as children:
+            child_ids = children.read().split()
+    except OSError:
+        return total
+    return total + sum(memory_kb(int(child)) for child in child_ids)
+
+
+class Command(BaseCommand):
+    help = ('Запускает gunicorn в режимах WSGI и ASGI с одинаковым числом '
+            'воркеров и сравнивает пропускную способность под нагрузкой на '
+            'частые запросы чтения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд нагрузки на каждый режим.')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Клиентов, которые все время нагрузки '
+                                 'по строке передают заголовки запроса.')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for module in ('gunicorn', 'uvicorn'):
+            if find_spec(module) is None:
+                raise CommandError(f'Установите {module}.')
+        with seeded_database({
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'subscriptions': 10,
+            'favorites': 20,
+            'cart': 5,
+            'seed': options['seed'],
+        }) as context:
+            if connection.vendor == 'sqlite' and \
+                    connection.is_in_memory_db():
+                raise CommandError(
+                    'Серверам нужна общая БД: PostgreSQL или файл SQLite '
+                    '(DATABASES["default"]["TEST"]["NAME"]).')
+            database = connection.settings_dict['NAME']
+            connection.close()
+            for mode in MODES:
+                self.run_mode(mode, context, database, options)
+
+    def start_server(self, mode, database, options):
+        env = {
+            **os.environ,
+            'SERVER_MODE': mode,
+            'POSTGRES_DB': str(database),
+            'GUNICORN_WORKERS': str(options['workers']),
+        }
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn',
+             '--bind', f'127.0.0.1:{options["port"]}',
+             '--log-level', 'error'],
+            cwd=settings.BASE_DIR, env=env)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} завершился при запуске.')
+            try:
+                socket.create_connection(
+                    ('127.0.0.1', options['port']), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не запустился.')
+
+    def run_mode(self, mode, context, database, options):
+        get_cache().clear()
+        local_tokens.clear()
+        paths = [quote(path.format(**context), safe='/?=&')
+                 for path in PATHS]
+        headers = {'Authorization': f'Token {context["token"]}'}
+        server = self.start_server(mode, database, options)
+        try:
+            for path in paths:
+                self.fetch(http.client.HTTPConnection(
+                    '127.0.0.1', options['port'], timeout=30),
+                    path, headers)
+            stop = threading.Event()
+            slow = [
+                threading.Thread(target=self.slow_client,
+                                 args=(options['port'], stop))
+                for _ in range(options['slow_clients'])
+            ]
+            results = [[] for _ in range(options['concurrency'])]
+            clients = [
+                threading.Thread(target=self.client, args=(
+                    options['port'], paths, headers, stop, latencies))
+                for latencies in results
+            ]
+            for thread in slow + clients:
+                thread.start()
+            started = time.perf_counter()
+            time.sleep(options['duration'])
+            stop.set()
+            for thread in clients + slow:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            memory = memory_kb(server.pid) / 1024
+        finally:
+            server.terminate()
+            server.wait()
+        latencies = sorted(
+            latency for client in results for latency in client
+            if latency is not None)
+        errors = sum(
+            latency is None for client in results for latency in client)
+        if not latencies:
+            self.stdout.write(f'{mode}: ни один запрос не завершился.')
+            return
+        self.stdout.write(
+            f'{mode:<5} воркеров={options["workers"]} '
+            f'клиентов={options["concurrency"]} '
+            f'медленных={options["slow_clients"]} '
+            f'запросов={len(latencies)} ошибок={errors} '
+            f'в секунду={len(latencies) / elapsed:.1f} '
+            f'p50={statistics.median(latencies) * 1000:.1f}ms '
+            f'p95={latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms '
+            f'память={memory:.0f}МБ')
+
+    def fetch(self, http_connection, path, headers):
+        http_connection.request('GET', path, headers=headers)
+        response = http_connection.getresponse()
+        response.read()
+        if response.status >= 400:
+            raise CommandError(f'{path}: ответ {response.status}.')
+
+    def client(self, port, paths, headers, stop, latencies):
+        http_connection = http.client.HTTPConnection(
+            '127.0.0.1', port, timeout=60)
+        index = 0
+        while not stop.is_set():
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                self.fetch(http_connection, path, headers)
+            except (OSError, http.client.HTTPException, CommandError):
+                http_connection.close()
+                latencies.append(None)
+                continue
+            latencies.append(time.perf_counter() - started)
+        http_connection.close()
+
+    def slow_client(self, port, stop):
+        """Держит соединение, отправляя по строке заголовков в секунду."""
+        try:
+            with socket.create_connection(('127.0.0.1', port)) as sock:
+                sock.sendall(b'GET /api/recipes/ HTTP/1.1\r\n'
+                             b'Host: localhost\r\n')
+                index = 0
+                while not stop.wait(1):
+                    sock.sendall(f'X-Slow-{index}: 1\r\n'.encode())
+                    index += 1
+        except OSError:
+            pass
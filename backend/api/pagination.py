@@ -1,8 +1,196 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from backend.consts import PAGE_SIZE
+from recipes import feed
+from recipes.models import FeedEntry
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки последней (или первой)
+    записи страницы, а следующая страница выбирается условием
+    «строго после этих значений». Порядок задается атрибутом
+    ``cursor_ordering`` представления; последнее поле должно быть
+    уникальным.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), 'page')
+
+        position, reverse = self.decode_cursor(request)
+        results = self.fetch(
+            queryset, self.get_ordering(reverse), position)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def fetch(self, queryset, ordering, position):
+        """Первые ``page_size + 1`` записей после ``position``."""
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(ordering, position))
+        return list(queryset[:self.page_size + 1])
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def get_position_filter(self, ordering, position):
+        position_filter = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position):
+                condition &= Q(**{previous.lstrip('-'): value})
+            position_filter |= condition
+        return position_filter
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            fields = [self.model._meta.get_field(field.lstrip('-'))
+                      for field in self.ordering]
+            position = [field.to_python(value)
+                        for field, value in zip(fields, cursor['p'])]
+            if len(position) != len(fields):
+                raise ValueError
+            return position, bool(cursor.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        position = [
+            self.model._meta.get_field(field.lstrip('-')).value_to_string(
+                instance)
+            for field in self.ordering
+        ]
+        cursor = json.dumps({'p': position, 'r': int(reverse)})
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(KeysetPagination):
+    """Лента подписок: записи FeedEntry плюс рецепты популярных авторов.
+
+    Рецепты обычных авторов выбираются по индексу ленты пользователя,
+    рецепты авторов, которые не раскладываются по лентам, — из таблицы
+    рецептов с тем же условием на курсор. Обе выборки ограничены размером
+    страницы и сливаются в памяти.
+    """
+
+    ordering = ('-pub_date', '-id')
+    entry_fields = {'pub_date': 'pub_date', 'id': 'recipe_id'}
+
+    def fetch(self, queryset, ordering, position):
+        user = self.request.user
+        popular = feed.popular_author_ids(user)
+        entry_ordering = tuple(
+            ('-' if field.startswith('-') else '')
+            + self.entry_fields[field.lstrip('-')]
+            for field in ordering)
+        entries = FeedEntry.objects.filter(user=user).exclude(
+            author_id__in=popular).order_by(*entry_ordering)
+        if position is not None:
+            entries = entries.filter(
+                self.get_position_filter(entry_ordering, position))
+        results = list(queryset.filter(pk__in=entries.values(
+            'recipe_id')[:self.page_size + 1]))
+        if popular:
+            results += super().fetch(
+                queryset.filter(author_id__in=popular), ordering, position)
+        results.sort(key=attrgetter(*(field.lstrip('-')
+                                      for field in ordering)),
+                     reverse=ordering[0].startswith('-'))
+        return results[:self.page_size + 1]
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничный вывод с параметрами ``page`` и ``limit``.
+
+    Если в запросе передан параметр ``cursor`` (в том числе пустой — для
+    первой страницы), а представление задает ``cursor_ordering``,
+    используется KeysetPagination.
+    """
+
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (KeysetPagination.cursor_query_param in request.query_params
+                and getattr(view, 'cursor_ordering', None)):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from rest_framework import exceptions, parsers, status
+
+# Запас на остальные поля запроса и заголовки частей формы.
+BODY_OVERHEAD = 64 * 1024
+
+
+class RequestTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+class UploadLimitMixin:
+    """Отклоняет запрос по заголовку Content-Length до чтения тела."""
+
+    # Настройка с наибольшим размером файла в запросе.
+    max_length_setting = 'IMAGE_UPLOAD_MAX_SIZE'
+
+    def get_max_length(self):
+        return getattr(settings, self.max_length_setting) + BODY_OVERHEAD
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        meta = parser_context['request'].META
+        try:
+            length = int(meta.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > self.get_max_length():
+            raise RequestTooLarge()
+        return super().parse(stream, media_type, parser_context)
+
+
+class ImageJSONParser(UploadLimitMixin, parsers.JSONParser):
+    """JSON с изображением в base64, которое на треть длиннее файла."""
+
+    def get_max_length(self):
+        return (getattr(settings, self.max_length_setting) * 4 // 3
+                + BODY_OVERHEAD)
+
+
+class ImageMultiPartParser(UploadLimitMixin, parsers.MultiPartParser):
+    """multipart/form-data; файлы пишутся во временные файлы на диске."""
+
+
+# Порядок как у парсеров DRF по умолчанию. Размер формы без файлов
+# ограничивает DATA_UPLOAD_MAX_MEMORY_SIZE самого Django.
+IMAGE_PARSERS = (ImageJSONParser, parsers.FormParser, ImageMultiPartParser)
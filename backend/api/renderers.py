@@ -0,0 +1,60 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, кодирующий ответ через orjson, если он установлен.
+
+    Результат совпадает с JSONRenderer байт в байт: компактные
+    разделители, символы вне ASCII без экранирования, экранированные
+    U+2028 и U+2029. Типы, которые orjson не поддерживает, кодируются
+    стандартным способом.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Текстовый рендерер для выгрузок.
+
+    Сами выгрузки отдаются потоком мимо рендерера, через него проходят
+    только ответы с ошибками.
+    """
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(
+                f'{key}: {self.render_value(value)}'
+                for key, value in data.items())
+        return self.render_value(data).encode(self.charset)
+
+    def render_value(self, value):
+        if isinstance(value, (list, tuple)):
+            return ' '.join(str(item) for item in value)
+        return str(value)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -0,0 +1,178 @@
+from collections import OrderedDict, defaultdict
+
+from backend import images
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingList
+from users.models import CustomUser, Subscribe
+
+from .cache import get_cache, get_generations, may_be_stale
+from .serializers import AuthorSerializer, RecipeSerializer
+
+RECIPE_KEY = 'recipe-payload:{id}:{version}'
+AUTHOR_KEY = 'author-payload:{id}:{version}'
+# Поля пользователя в общем представлении автора.
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name',
+                 'avatar', 'avatar_variants')
+
+
+def get_payloads(objects, key_template, scopes, serialize):
+    """Возвращает общие для всех пользователей представления ``objects``.
+
+    Представления хранятся в кэше под ключом из версий ``scopes``;
+    недостающие сериализуются функцией ``serialize`` и сохраняются.
+    """
+    if not objects:
+        return {}
+    cache = get_cache()
+    versions = get_generations(*(
+        scope for obj in objects for scope in scopes(obj)))
+    step = len(versions) // len(objects)
+    keys = {
+        obj.pk: key_template.format(
+            id=obj.pk,
+            version='.'.join(map(str, versions[index:index + step])))
+        for obj, index in zip(objects, range(0, len(versions), step))
+    }
+    payloads = cache.get_many(keys.values())
+    missing = [obj for obj in objects if keys[obj.pk] not in payloads]
+    if missing:
+        fresh = {
+            keys[obj.pk]: payload
+            for obj, payload in zip(missing, serialize(missing))
+        }
+        cache.set_many({
+            keys[obj.pk]: fresh[keys[obj.pk]] for obj in missing
+            if not may_be_stale(*scopes(obj))
+        })
+        payloads.update(fresh)
+    return {pk: payloads[key] for pk, key in keys.items()}
+
+
+def serialize_recipes(recipes):
+    """Строит общие представления рецептов без сериализаторов DRF.
+
+    Теги и ингредиенты загружаются одним запросом ``values()`` каждый;
+    формат совпадает с RecipeSerializer без полей пользователя.
+    """
+    ids = [recipe.pk for recipe in recipes]
+    tags = defaultdict(list)
+    for row in Recipe.tags.through.objects.filter(
+        recipe_id__in=ids
+    ).order_by('tag_id').values('recipe_id', 'tag_id', 'tag__name',
+                                'tag__slug'):
+        tags[row['recipe_id']].append({
+            'id': row['tag_id'],
+            'name': row['tag__name'],
+            'slug': row['tag__slug'],
+        })
+    ingredients = defaultdict(list)
+    for row in RecipeIngredient.objects.filter(
+        recipe_id__in=ids
+    ).order_by('pk').values('recipe_id', 'ingredient_id', 'ingredient__name',
+                            'ingredient__measurement_unit', 'amount'):
+        ingredients[row['recipe_id']].append({
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        })
+    return [
+        {
+            'id': recipe.pk,
+            'tags': tags[recipe.pk],
+            'ingredients': ingredients[recipe.pk],
+            'name': recipe.name,
+            'image': recipe.image.url if recipe.image else '',
+            'image_variants': images.variant_urls(
+                recipe.image_variants, recipe.image.storage),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        for recipe in recipes
+    ]
+
+
+def serialize_authors(authors):
+    storage = CustomUser._meta.get_field('avatar').storage
+    rows = {
+        row['id']: row for row in CustomUser.objects.filter(
+            pk__in=[author.pk for author in authors]
+        ).values(*AUTHOR_FIELDS)
+    }
+    for row in rows.values():
+        row['avatar'] = storage.url(row['avatar']) if row['avatar'] else None
+        row['avatar_variants'] = images.variant_urls(
+            row['avatar_variants'], storage)
+    return [rows[author.pk] for author in authors]
+
+
+def get_flags(recipes, model, attribute, user):
+    if all(hasattr(recipe, attribute) for recipe in recipes):
+        return {recipe.pk for recipe in recipes if getattr(recipe, attribute)}
+    return set(model.objects.filter(
+        user=user, recipe__in=[recipe.pk for recipe in recipes]
+    ).values_list('recipe_id', flat=True))
+
+
+def render_recipes(recipes, request):
+    """Собирает представления рецептов из общего кэша и данных пользователя.
+
+    Результат совпадает с RecipeSerializer, но общая часть рецептов и
+    авторов берется из кэша, а отметки избранного, корзины и подписки
+    загружаются одним запросом на каждую.
+    """
+    recipes = list(recipes)
+    author_ids = {recipe.author_id for recipe in recipes}
+    recipe_payloads = get_payloads(
+        recipes,
+        RECIPE_KEY,
+        lambda recipe: (f'recipe:{recipe.pk}', 'tags', 'ingredients'),
+        serialize_recipes,
+    )
+    author_payloads = get_payloads(
+        [CustomUser(pk=author_id) for author_id in author_ids],
+        AUTHOR_KEY,
+        lambda author: (f'user:{author.pk}',),
+        serialize_authors,
+    )
+
+    user = request.user
+    favorited = in_cart = subscribed = set()
+    if user.is_authenticated and recipes:
+        favorited = get_flags(recipes, Favorite, 'is_favorited', user)
+        in_cart = get_flags(
+            recipes, ShoppingList, 'is_in_shopping_cart', user)
+        subscribed = set(Subscribe.objects.filter(
+            user=user, author__in=author_ids
+        ).values_list('author_id', flat=True))
+
+    flags = {'is_favorited': favorited, 'is_in_shopping_cart': in_cart}
+    results = []
+    for recipe in recipes:
+        payload = recipe_payloads[recipe.pk]
+        representation = OrderedDict()
+        for field in RecipeSerializer.Meta.fields:
+            if field == 'author':
+                representation[field] = render_author(
+                    author_payloads[recipe.author_id],
+                    recipe.author_id in subscribed,
+                    request,
+                )
+            elif field in flags:
+                representation[field] = recipe.pk in flags[field]
+            else:
+                representation[field] = payload[field]
+        results.append(representation)
+    return results
+
+
+def render_author(payload, is_subscribed, request):
+    representation = OrderedDict()
+    for field in AuthorSerializer.Meta.fields:
+        if field == 'is_subscribed':
+            representation[field] = is_subscribed
+        elif field == 'avatar' and payload[field]:
+            representation[field] = request.build_absolute_uri(
+                payload[field])
+        else:
+            representation[field] = payload[field]
+    return representation
@@ -1,14 +1,49 @@
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+from rest_framework.utils import html
+
+from backend import images
+from backend.consts import BULK_RECIPES_LIMIT
+from backend.upserts import delete_pks, insert_or_ignore
+from recipes import cart_totals
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+                            ShoppingCartTotal, ShoppingList, Tag)
 from users.models import CustomUser, Subscribe
 
+from .fields import ImageUploadField
+
+
+def create_once(model, validated_data, message):
+    """Создает запись без предварительной проверки существования.
+
+    Повторная запись отклоняется той же ошибкой валидации, что и раньше,
+    в том числе при одновременных запросах.
+    """
+    instance = insert_or_ignore(model, **validated_data)
+    if instance is None:
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [message]})
+    return instance
+
+
+def check_ids(queryset, ids):
+    """Проверяет существование всех id одним запросом id__in."""
+    found = set(queryset.filter(id__in=ids).values_list('id', flat=True))
+    for pk in ids:
+        if pk not in found:
+            raise serializers.ValidationError(
+                serializers.PrimaryKeyRelatedField.default_error_messages[
+                    'does_not_exist'].format(pk_value=pk))
+    return ids
+
 
 class AuthorSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(default=False)
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = ImageUploadField(required=False, allow_null=True)
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
@@ -20,9 +55,12 @@ class AuthorSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_variants',
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (
             bool(request)
@@ -31,6 +69,9 @@ class AuthorSerializer(serializers.ModelSerializer):
                 user=request.user, author=obj.id).exists()
         )
 
+    def get_avatar_variants(self, obj):
+        return images.variant_urls(obj.avatar_variants, obj.avatar.storage)
+
     def validate_avatar(self, avatar):
         if not avatar:
             raise serializers.ValidationError('Поле аватара обязательно.')
@@ -38,7 +79,7 @@ class AuthorSerializer(serializers.ModelSerializer):
 
 
 class UserAvatarSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField()
+    avatar = ImageUploadField()
 
     class Meta:
         fields = ('avatar',)
@@ -60,20 +101,19 @@ class UserSerializer(AuthorSerializer):
         model = CustomUser
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes', 'recipes_count', 'avatar'
+            'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+            'avatar_variants',
         )
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        if hasattr(obj, 'latest_recipes'):
+            return ShortRecipeSerializer(
+                obj.latest_recipes, many=True,
+                context={'request': request}).data
         recipes_limit = self.context.get('recipes_limit')
 
         recipes = obj.recipes.all()
-        if recipes_limit is not None:
-            try:
-                recipes_limit = int(recipes_limit)
-            except ValueError:
-                recipes_limit = None
-
         if recipes_limit is not None:
             recipes = recipes[:recipes_limit]
 
@@ -81,7 +121,23 @@ class UserSerializer(AuthorSerializer):
             recipes, many=True, context={'request': request}).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(
+        required=False, default=None, min_value=0)
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -98,12 +154,12 @@ class SubscribeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Вы не можете подписаться на себя.")
 
-        if Subscribe.objects.filter(user=user, author=author).exists():
-            raise serializers.ValidationError(
-                "Вы уже подписаны на этого автора.")
-
         return attrs
 
+    def create(self, validated_data):
+        return create_once(
+            Subscribe, validated_data, "Вы уже подписаны на этого автора.")
+
     def to_representation(self, instance):
         user_data = UserSerializer(instance.author, context=self.context).data
         return user_data
@@ -123,8 +179,33 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit',)
 
 
+class IngredientSearchSerializer(serializers.Serializer):
+    name = serializers.CharField(required=False, default='')
+    limit = serializers.IntegerField(
+        required=False, default=None, min_value=1)
+    ordering = serializers.ChoiceField(
+        choices=('popularity',), required=False, default=None)
+
+
+class ShoppingCartExportSerializer(serializers.Serializer):
+    group = serializers.ChoiceField(
+        choices=('unit',), required=False, default=None)
+    recipes = serializers.BooleanField(required=False, default=False)
+
+
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -134,24 +215,42 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class FormListSerializer(serializers.ListSerializer):
+    """Список вложенных объектов, который в multipart/form-data передается
+    полями вида ``ingredients[0]id``, в том числе при частичном изменении."""
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary):
+            return html.parse_html_list(
+                dictionary, prefix=self.field_name, default=empty)
+        return super().get_value(dictionary)
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = FormListSerializer
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj.image_variants, obj.image.storage)
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
@@ -160,7 +259,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = ImageUploadField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -173,6 +273,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
@@ -182,7 +283,12 @@ class RecipeSerializer(serializers.ModelSerializer):
             return obj.image.url
         return ''
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj.image_variants, obj.image.storage)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             bool(request)
@@ -192,6 +298,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (
             bool(request)
@@ -207,8 +315,9 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(required=True, allow_null=True)
+    image = ImageUploadField(required=True, allow_null=True)
     ingredients = RecipeIngredientCreateSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
 
     class Meta:
         model = Recipe
@@ -227,6 +336,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time': {'required': True},
         }
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
@@ -235,28 +345,59 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             author=self.context.get('request').user,
         )
         recipe.tags.set(tags_data)
-        self.create_ingredients(recipe, ingredients_data)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=item['id'],
+                             amount=item['amount'])
+            for item in ingredients_data
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags_data = validated_data.pop('tags')
-        instance.tags.set(tags_data)
-
-        ingredients_data = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.create_ingredients(instance, ingredients_data)
-
+        tags_data = validated_data.pop('tags', None)
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        ingredients_data = validated_data.pop('ingredients', None)
+        if ingredients_data is not None:
+            self.update_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
-    def create_ingredients(self, recipe, ingredients_data):
-        ingredient_list = []
-        for ingredient in ingredients_data:
-            recipe_ingredient_item = RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
-            ingredient_list.append(recipe_ingredient_item)
-        RecipeIngredient.objects.bulk_create(ingredient_list)
+    def update_ingredients(self, recipe, ingredients_data):
+        """Применяет к составу рецепта только разницу с текущими строками.
+
+        Строки добавляются, меняются и удаляются массовыми запросами без
+        сигналов, поэтому итоги корзин пересчитываются здесь же и только
+        по затронутым ингредиентам.
+        """
+        amounts = {item['id']: item['amount'] for item in ingredients_data}
+        existing = {row.ingredient_id: row
+                    for row in recipe.recipeingredient_set.all()}
+        removed = existing.keys() - amounts.keys()
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        changed = []
+        for ingredient_id, row in existing.items():
+            if ingredient_id in amounts and row.amount != amounts[
+                    ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+
+        if removed:
+            # У RecipeIngredient есть обработчики удаления, которые
+            # пересчитывали бы итоги по строке; итоги обновляются ниже.
+            delete_pks(RecipeIngredient, [existing[ingredient_id].pk
+                                          for ingredient_id in removed])
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        touched = removed | {row.ingredient_id for row in changed + added}
+        if touched:
+            cart_totals.refresh_ingredients(recipe.pk, touched)
 
     def validate_image(self, value):
         if value is None:
@@ -265,6 +406,14 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
         return value
 
+    def validate_tags(self, value):
+        return check_ids(Tag.objects.all(), value)
+
+    def validate_ingredients(self, value):
+        check_ids(Ingredient.objects.all(),
+                  [ingredient['id'] for ingredient in value])
+        return value
+
     def validate(self, attrs):
         ingredients = attrs.get('ingredients', [])
         tags = attrs.get('tags', [])
@@ -288,6 +437,8 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return attrs
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', 'recipeingredient_set__ingredient')
         serializer = RecipeSerializer(instance)
         return serializer.data
 
@@ -297,12 +448,9 @@ class FavoriteSerializer(serializers.ModelSerializer):
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        if Favorite.objects.filter(
-            user=data['user'], recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError("Этот рецепт уже в избранном.")
-        return data
+    def create(self, validated_data):
+        return create_once(
+            Favorite, validated_data, "Этот рецепт уже в избранном.")
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -317,12 +465,9 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = ShoppingList
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        if ShoppingList.objects.filter(
-            user=data['user'], recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError("Этот рецепт уже в корзине.")
-        return data
+    def create(self, validated_data):
+        return create_once(
+            ShoppingList, validated_data, "Этот рецепт уже в корзине.")
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -0,0 +1,126 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from users.models import CustomUser, Subscribe
+
+from .authentication import auth_scope
+from .cache import bump_generations
+from .representations import AUTHOR_FIELDS
+
+
+def bump_on_commit(*scopes):
+    """Меняет поколения после фиксации транзакции.
+
+    Иначе параллельный запрос успел бы закэшировать под новым поколением
+    данные, прочитанные до фиксации, и они жили бы до следующей записи.
+    """
+    transaction.on_commit(lambda: bump_generations(*scopes))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.pk}')
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_on_commit('recipes', f'recipe:{instance.pk}')
+    elif pk_set:
+        bump_on_commit(
+            'recipes', *(f'recipe:{pk}' for pk in pk_set))
+    else:
+        bump_on_commit('recipes', 'tags')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_on_commit('tags', 'recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_on_commit('ingredients', 'recipes')
+
+
+def author_values(get):
+    return {
+        name: CustomUser._meta.get_field(name).get_prep_value(get(name))
+        for name in AUTHOR_FIELDS
+    }
+
+
+@receiver(pre_save, sender=CustomUser)
+def author_saving(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    instance.previous_author = None
+    if raw or not instance.pk or (
+            update_fields and not set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    instance.previous_author = CustomUser.objects.filter(
+        pk=instance.pk).values(*AUTHOR_FIELDS, 'recipes_count').first()
+
+
+@receiver(post_save, sender=CustomUser)
+def author_changed(sender, instance, created, **kwargs):
+    """Сбрасывает представление автора, если изменились его поля в нем.
+
+    Списки рецептов сбрасываются, только если у автора есть рецепты:
+    регистрация, смена пароля и отметки входа их не трогают.
+    """
+    previous = getattr(instance, 'previous_author', None)
+    if created or previous is None or author_values(
+            previous.get) == author_values(partial(getattr, instance)):
+        return
+    if previous['recipes_count']:
+        bump_on_commit('recipes', f'user:{instance.pk}')
+    else:
+        bump_on_commit(f'user:{instance.pk}')
+
+
+@receiver(post_delete, sender=CustomUser)
+def author_deleted(sender, instance, **kwargs):
+    # Рецепты удаляются каскадом и сами сбрасывают списки.
+    bump_on_commit(f'user:{instance.pk}')
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_auth_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_on_commit(auth_scope(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    bump_on_commit(auth_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def overlay_changed(sender, instance, **kwargs):
+    bump_on_commit(f'overlay:{instance.user_id}')
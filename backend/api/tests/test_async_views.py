@@ -0,0 +1,32 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from backend.async_views import async_view
+
+
+class AsyncViewTests(SimpleTestCase):
+    """Обертка ASGI отправляет в пул потоков только чтение."""
+
+    def call(self, method):
+        threads = []
+
+        def view(request):
+            threads.append(threading.get_ident())
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        async_to_sync(async_view(view))(request)
+        return threads[0]
+
+    def test_reads_run_in_pool(self):
+        for method in ('get', 'head'):
+            with self.subTest(method=method):
+                self.assertNotEqual(self.call(method), threading.get_ident())
+
+    def test_writes_stay_on_shared_thread(self):
+        for method in ('post', 'put', 'patch', 'delete'):
+            with self.subTest(method=method):
+                self.assertEqual(self.call(method), threading.get_ident())
@@ -0,0 +1,48 @@
+import hashlib
+import pickle
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from api.authentication import (TOKEN_KEY, CachedTokenAuthentication,
+                                local_tokens)
+from api.cache import get_cache
+from users.models import CustomUser
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        local_tokens.clear()
+        self.user = CustomUser.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Имя', last_name='Фамилия', password='secret-123')
+        self.key = Token.objects.create(user=self.user).key
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(
+            self.key)
+
+    def test_shared_cache_has_no_password_hash(self):
+        self.authenticate()
+        entry = get_cache().get(TOKEN_KEY.format(
+            hashlib.sha256(self.key.encode()).hexdigest()))
+        self.assertIsNotNone(entry)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(entry))
+
+    def test_user_is_rebuilt_for_every_request(self):
+        first, token = self.authenticate()
+        with self.assertNumQueries(0):
+            second, _ = self.authenticate()
+        self.assertIsNot(first, second)
+        self.assertEqual(
+            (second.pk, second.username, token.key),
+            (self.user.pk, 'reader', self.key))
+
+    def test_deferred_fields_load_in_one_query(self):
+        self.authenticate()
+        user, _ = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('secret-123'))
+            self.assertEqual(user.email, 'reader@example.com')
@@ -0,0 +1,89 @@
+import threading
+from collections import Counter
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartTotal, ShoppingList)
+from users.models import CustomUser, Subscribe
+
+THREADS = 8
+ROUNDS = 5
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'SQLite не допускает одновременной записи.')
+class ConcurrentWritesTests(TransactionTestCase):
+    """Одинаковые запросы из нескольких потоков создают одну запись."""
+
+    def setUp(self):
+        self.user, self.author = (
+            CustomUser.objects.create_user(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия', password=None)
+            for username in ('reader', 'writer'))
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', author=self.author, cooking_time=10,
+            text='Описание', image='recipes/images/benchmark.png',
+            image_variants={'source': 'recipes/images/benchmark.png'})
+        for index in range(3):
+            RecipeIngredient.objects.create(
+                recipe=self.recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {index}', measurement_unit='г'),
+                amount=index + 1,
+            )
+        self.token = Token.objects.create(user=self.user).key
+
+    def hammer(self, path):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def worker():
+            client = Client(raise_request_exception=False,
+                            HTTP_AUTHORIZATION=f'Token {self.token}')
+            try:
+                barrier.wait()
+                statuses.append(client.post(path).status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return Counter(statuses)
+
+    def check_target(self, path, model, **lookup):
+        for _ in range(ROUNDS):
+            model.objects.filter(**lookup).delete()
+            self.assertEqual(self.hammer(path),
+                             Counter({201: 1, 400: THREADS - 1}))
+        self.assertEqual(model.objects.filter(**lookup).count(), 1)
+
+    def test_favorite(self):
+        self.check_target(f'/api/recipes/{self.recipe.pk}/favorite/',
+                          Favorite, user=self.user, recipe=self.recipe)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        self.check_target(f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+                          ShoppingList, user=self.user, recipe=self.recipe)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertEqual(
+            sorted(ShoppingCartTotal.objects.filter(
+                user=self.user).values_list('ingredient_id', 'amount')),
+            sorted(recipe.recipeingredient_set.values_list(
+                'ingredient_id', 'amount')))
+
+    def test_subscribe(self):
+        self.check_target(f'/api/users/{self.author.pk}/subscribe/',
+                          Subscribe, user=self.user, author=self.author)
+        author = CustomUser.objects.get(pk=self.author.pk)
+        self.assertEqual(author.followers_count, 1)
@@ -0,0 +1,47 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import CustomUser, Subscribe
+
+
+class CreateOnceTests(TestCase):
+    """Повторное добавление отклоняется с кодом 400 на любой БД."""
+
+    def setUp(self):
+        self.user, self.author = (
+            CustomUser.objects.create_user(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия', password=None)
+            for username in ('reader', 'writer'))
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', author=self.author, cooking_time=10,
+            text='Описание', image='recipes/images/test.png',
+            image_variants={'source': 'recipes/images/test.png'})
+        token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def check_twice(self, path, model, **lookup):
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertEqual(self.client.post(path).status_code, 400)
+        self.assertEqual(model.objects.filter(**lookup).count(), 1)
+
+    def test_favorite(self):
+        self.check_twice(f'/api/recipes/{self.recipe.pk}/favorite/',
+                         Favorite, user=self.user, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        self.check_twice(f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+                         ShoppingList, user=self.user, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 1)
+
+    def test_subscribe(self):
+        self.check_twice(f'/api/users/{self.author.pk}/subscribe/',
+                         Subscribe, user=self.user, author=self.author)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
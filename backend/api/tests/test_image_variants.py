@@ -0,0 +1,47 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+VARIANTS = {
+    'source': 'recipes/images/test.png',
+    'thumbnail': {'webp': 'recipes/images/variants/test-thumbnail.webp'},
+}
+URLS = {'thumbnail': {'webp': '/media/recipes/images/variants/'
+                              'test-thumbnail.webp'}}
+
+
+class VariantUrlsTests(TestCase):
+    """Адреса вариантов изображений одинаковы во всех ответах."""
+
+    def setUp(self):
+        self.user, self.author = (
+            CustomUser.objects.create_user(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия', password=None)
+            for username in ('reader', 'writer'))
+        CustomUser.objects.filter(pk=self.author.pk).update(
+            avatar='recipes/images/test.png', avatar_variants=VARIANTS)
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', author=self.author, cooking_time=10,
+            text='Описание', image='recipes/images/test.png',
+            image_variants=VARIANTS)
+        token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def test_recipe_variants(self):
+        detail = self.client.get(f'/api/recipes/{self.recipe.pk}/').json()
+        listed = self.client.get('/api/recipes/').json()['results'][0]
+        favorite = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/').json()
+        for payload in (detail, listed, favorite):
+            self.assertEqual(payload['image_variants'], URLS)
+
+    def test_avatar_variants(self):
+        detail = self.client.get(f'/api/recipes/{self.recipe.pk}/').json()
+        user = self.client.get(f'/api/users/{self.author.pk}/').json()
+        for payload in (detail['author'], user):
+            self.assertEqual(payload['avatar_variants'], URLS)
@@ -0,0 +1,50 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartTotal, ShoppingList, Tag)
+from users.models import CustomUser
+
+
+class UpdateIngredientsTests(TestCase):
+    """Изменение состава рецепта обновляет итоги корзин."""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(
+            email='writer@example.com', username='writer',
+            first_name='Имя', last_name='Фамилия', password=None)
+        self.tag = Tag.objects.create(name='Тег', slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)]
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', author=self.author, cooking_time=10,
+            text='Описание', image='recipes/images/test.png',
+            image_variants={'source': 'recipes/images/test.png'})
+        for ingredient in self.ingredients[:2]:
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=10)
+        ShoppingList.objects.create(user=self.author, recipe=self.recipe)
+        token = Token.objects.create(user=self.author).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def test_removed_changed_and_added_rows(self):
+        first, second, third = self.ingredients
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'tags': [self.tag.pk],
+             'ingredients': [{'id': second.pk, 'amount': 5},
+                             {'id': third.pk, 'amount': 7}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        expected = [(second.pk, 5), (third.pk, 7)]
+        self.assertEqual(
+            sorted(self.recipe.recipeingredient_set.values_list(
+                'ingredient_id', 'amount')), expected)
+        self.assertEqual(
+            sorted(ShoppingCartTotal.objects.filter(
+                user=self.author).values_list('ingredient_id', 'amount')),
+            expected)
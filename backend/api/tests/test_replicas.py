@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+
+from backend.replicas import ReplicaMiddleware, ReplicaRouter
+from recipes.models import Recipe
+
+REPLICA = 'replica0'
+
+
+def call(request, atomic=False):
+    """Пропускает запрос через ReplicaMiddleware и возвращает БД чтения."""
+    used = []
+
+    def get_response(request):
+        if atomic:
+            with transaction.atomic():
+                used.append(ReplicaRouter().db_for_read(Recipe))
+        else:
+            used.append(ReplicaRouter().db_for_read(Recipe))
+        return HttpResponse()
+
+    response = ReplicaMiddleware(get_response)(request)
+    return used[0], response
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches[settings.API_CACHE_ALIAS].clear()
+
+    def test_safe_request_reads_from_replica(self):
+        for method in ('get', 'head', 'options'):
+            with self.subTest(method=method):
+                database, _ = call(getattr(self.factory, method)('/'))
+                self.assertEqual(database, REPLICA)
+
+    def test_unsafe_request_uses_primary(self):
+        for method in ('post', 'put', 'patch', 'delete'):
+            with self.subTest(method=method):
+                database, _ = call(getattr(self.factory, method)('/'))
+                self.assertEqual(database, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_client_by_cookie(self):
+        _, response = call(self.factory.post('/'))
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        database, _ = call(request)
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_client_by_token(self):
+        call(self.factory.post('/', HTTP_AUTHORIZATION='Token first'))
+        database, _ = call(
+            self.factory.get('/', HTTP_AUTHORIZATION='Token first'))
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+        database, _ = call(
+            self.factory.get('/', HTTP_AUTHORIZATION='Token second'))
+        self.assertEqual(database, REPLICA)
+
+    def test_no_replicas_reads_from_primary(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            database, _ = call(self.factory.get('/'))
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate(REPLICA, 'recipes'), False)
+        self.assertIsNone(router.allow_migrate(DEFAULT_DB_ALIAS, 'recipes'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTransactionTests(TransactionTestCase):
+
+    def test_read_inside_atomic_uses_primary(self):
+        database, _ = call(RequestFactory().get('/'), atomic=True)
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
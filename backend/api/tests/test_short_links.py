@@ -0,0 +1,62 @@
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes import short_links
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+class ShortLinkTests(TestCase):
+    """Ссылка нового рецепта вычисляется по id и не пишется в БД."""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(
+            email='writer@example.com', username='writer',
+            first_name='Имя', last_name='Фамилия', password=None)
+        self.client = APIClient()
+        short_links.resolve_cached.cache_clear()
+
+    def create_recipe(self, **values):
+        return Recipe.objects.create(
+            name='Рецепт', author=self.author, cooking_time=10,
+            text='Описание', image='recipes/images/test.png',
+            image_variants={'source': 'recipes/images/test.png'}, **values)
+
+    def test_link_known_in_post_save(self):
+        links = []
+
+        def receiver(instance, created, **kwargs):
+            links.append(instance.get_short_link())
+
+        post_save.connect(receiver, sender=Recipe)
+        self.addCleanup(post_save.disconnect, receiver, sender=Recipe)
+        with CaptureQueriesContext(connection) as queries:
+            recipe = self.create_recipe()
+        self.assertEqual(links, [short_links.encode(recipe.pk)])
+        writes = [query['sql'] for query in queries if query['sql'].startswith(
+            ('INSERT INTO "recipes_recipe"', 'UPDATE "recipes_recipe"'))]
+        self.assertEqual(len(writes), 1, writes)
+
+    def test_new_link_redirects(self):
+        recipe = self.create_recipe()
+        response = self.client.get(f'/s/{recipe.get_short_link()}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(
+            f'/recipes/{recipe.pk}/'))
+
+    def test_old_link_redirects(self):
+        recipe = self.create_recipe(short_link='OLDLINK')
+        self.assertEqual(recipe.get_short_link(), 'OLDLINK')
+        response = self.client.get('/s/OLDLINK/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_unknown_links(self):
+        recipe = self.create_recipe()
+        self.assertIsNone(short_links.decode('0' + recipe.get_short_link()))
+        for link in ('0' + recipe.get_short_link(), 'zzzzzzzzzzzzzzzzzz',
+                     short_links.encode(recipe.pk + 1), 'MISSING'):
+            self.assertEqual(
+                self.client.get(f'/s/{link}/').status_code, 404, link)
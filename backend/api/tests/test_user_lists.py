@@ -0,0 +1,98 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartTotal, ShoppingList)
+from users.models import CustomUser
+
+
+class BulkUserListsTests(TestCase):
+    """Массовые операции с избранным и корзиной обновляют счетчики и итоги
+    корзины."""
+
+    def setUp(self):
+        self.user, self.author = (
+            CustomUser.objects.create_user(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия', password=None)
+            for username in ('reader', 'writer'))
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(2)]
+        self.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {index}', author=self.author, cooking_time=10,
+                text='Описание', image='recipes/images/test.png',
+                image_variants={'source': 'recipes/images/test.png'})
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=index + 1)
+            self.recipes.append(recipe)
+        self.ingredients = ingredients
+        token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def send(self, method, path, recipes):
+        response = getattr(self.client, method)(
+            path, {'recipes': recipes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status'] for item in response.json()}
+
+    def counters(self, field):
+        return [getattr(recipe, field) for recipe in Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in self.recipes]).order_by('pk')]
+
+    def totals(self):
+        return sorted(ShoppingCartTotal.objects.filter(
+            user=self.user).values_list('ingredient_id', 'amount'))
+
+    def test_favorite(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        Favorite.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            self.send('post', '/api/recipes/favorite/',
+                      [first, second, 10 ** 6]),
+            {first: 'exists', second: 'added', 10 ** 6: 'not_found'})
+        self.assertEqual(self.counters('favorites_count'), [1, 1, 0])
+        self.assertEqual(
+            self.send('delete', '/api/recipes/favorite/', [second, third]),
+            {second: 'removed', third: 'missing'})
+        self.assertEqual(self.counters('favorites_count'), [1, 0, 0])
+        self.assertEqual(
+            list(Favorite.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)), [first])
+
+    def test_shopping_cart(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        ShoppingList.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            self.send('post', '/api/recipes/shopping_cart/',
+                      [first, second, third]),
+            {first: 'exists', second: 'added', third: 'added'})
+        self.assertEqual(self.counters('in_carts_count'), [1, 1, 1])
+        self.assertEqual(
+            self.totals(),
+            [(ingredient.pk, 6) for ingredient in self.ingredients])
+        self.assertEqual(
+            self.send('delete', '/api/recipes/shopping_cart/', [third]),
+            {third: 'removed'})
+        self.assertEqual(self.counters('in_carts_count'), [1, 1, 0])
+        self.assertEqual(
+            self.totals(),
+            [(ingredient.pk, 3) for ingredient in self.ingredients])
+
+    def test_clear_shopping_cart(self):
+        for recipe in self.recipes[:2]:
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+        response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item['id']: item['status'] for item in response.json()},
+            {recipe.pk: 'removed' for recipe in self.recipes[:2]})
+        self.assertEqual(self.counters('in_carts_count'), [0, 0, 0])
+        self.assertEqual(self.totals(), [])
+        self.assertFalse(ShoppingList.objects.filter(user=self.user).exists())
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from backend.async_views import async_patterns
+
 from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
                     TagViewSet)
 
@@ -28,8 +31,21 @@ router.register(
     basename='users'
 )
 
+# Частые запросы на чтение и выгрузка, которую медленный клиент может
+# скачивать долго, в режиме ASGI обслуживаются пулом потоков.
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'ingredients-list',
+)
+
+router_urls = router.urls
+if settings.SERVER_MODE == 'asgi':
+    router_urls = async_patterns(router_urls, ASYNC_ROUTES)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
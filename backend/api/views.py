@@ -1,44 +1,123 @@
-import csv
-import io
+from collections import defaultdict
 
-from django.db.models import Sum
-from django.http import FileResponse, HttpResponseRedirect
+from django.db import transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import decorators, permissions, response, status, viewsets
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+from recipes import short_links, user_lists
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCartTotal,
                             ShoppingList, Tag)
 from users.models import CustomUser, Subscribe
+
+from .cache import AnonymousCacheMixin, ConditionalGetMixin, bump_generations
+from .exports import export_shopping_cart
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .ingredient_index import ingredient_index
+from .pagination import FeedPagination, LimitPageNumberPagination
+from .parsers import IMAGE_PARSERS
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (AuthorSerializer, CreateRecipeSerializer,
-                          FavoriteSerializer, IngredientSerializer,
-                          RecipeSerializer, ShoppingCartSerializer,
-                          SubscribeSerializer, TagSerializer,
-                          UserAvatarSerializer, UserSerializer)
-
-
-class RecipeViewSet(viewsets.ModelViewSet):
+from .renderers import CSVRenderer, FastJSONRenderer, PlainTextRenderer
+from .representations import render_recipes
+from .serializers import (AuthorSerializer, BulkRecipesSerializer,
+                          CreateRecipeSerializer, FavoriteSerializer,
+                          IngredientSearchSerializer, IngredientSerializer,
+                          RecipeSerializer, RecipesLimitSerializer,
+                          ShoppingCartExportSerializer, ShoppingCartSerializer,
+                          ShoppingCartTotalSerializer, SubscribeSerializer,
+                          TagSerializer, UserAvatarSerializer, UserSerializer)
+
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = LimitPageNumberPagination
     ordering = ('-pub_date',)
+    cursor_ordering = ('-pub_date', '-id')
+    cache_scopes = ('recipes',)
     permission_classes = (IsAuthorOrReadOnly,
                           permissions.IsAuthenticatedOrReadOnly)
+    parser_classes = IMAGE_PARSERS
+
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.action not in ('list', 'retrieve', 'feed'):
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return CreateRecipeSerializer
         return RecipeSerializer
 
+    def get_recipe_state(self):
+        if not hasattr(self, 'recipe_state'):
+            try:
+                self.recipe_state = Recipe.objects.filter(
+                    pk=self.kwargs['pk']
+                ).values('author_id', 'updated_at').first()
+            except (TypeError, ValueError):
+                self.recipe_state = None
+        return self.recipe_state
+
+    def get_cache_scopes(self, request, *args, **kwargs):
+        if self.action != 'retrieve':
+            return self.cache_scopes
+        state = self.get_recipe_state()
+        if state is None:
+            return None
+        return (f'recipe:{self.kwargs["pk"]}', f'user:{state["author_id"]}',
+                'tags', 'ingredients')
+
+    def get_last_modified(self, request, *args, **kwargs):
+        if self.action == 'retrieve':
+            return int(self.get_recipe_state()['updated_at'].timestamp())
+        return None
+
+    def render_list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(render_recipes(page, request))
+
+    def render_retrieve(self, request, *args, **kwargs):
+        return response.Response(
+            render_recipes([self.get_object()], request)[0])
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_generations('recipes', f'recipe:{serializer.instance.pk}')
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_generations('recipes', f'recipe:{serializer.instance.pk}')
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        super().perform_destroy(instance)
+        bump_generations('recipes', f'recipe:{pk}')
+
+    @transaction.atomic
     def remove_item(self, model, request, pk=None):
         recipe = self.get_object()
         user = request.user
 
+        # Та же блокировка, что у массовых операций: иначе массовое
+        # удаление могло бы вычесть рецепт из итогов корзины второй раз.
+        user_lists.lock_user(user.pk)
         delete_count, _ = model.objects.filter(
             user=user, recipe=recipe).delete()
 
@@ -51,8 +130,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    @transaction.atomic
     def add_to_list(self, serializer_class, request, recipe):
         user = request.user
+        user_lists.lock_user(user.pk)
         serializer = serializer_class(
             data={'user': user.id, 'recipe': recipe.id},
             context={'request': request}
@@ -63,6 +144,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.data, status=status.HTTP_201_CREATED
         )
 
+    def bulk_response(self, statuses):
+        bump_generations(f'overlay:{self.request.user.pk}')
+        return response.Response([
+            {'id': recipe_id, 'status': recipe_status}
+            for recipe_id, recipe_status in statuses.items()
+        ])
+
+    def bulk_add(self, model, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.bulk_response(user_lists.add_recipes(
+            model, request.user, serializer.validated_data['recipes']))
+
+    def bulk_remove(self, model, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.bulk_response(user_lists.remove_recipes(
+            model, request.user, serializer.validated_data['recipes']))
+
     @decorators.action(
         detail=True,
         methods=['post'],
@@ -76,6 +176,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def remove_favorite(self, request, pk=None):
         return self.remove_item(Favorite, request, pk)
 
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_add(Favorite, request)
+
+    @bulk_favorite.mapping.delete
+    def bulk_remove_favorite(self, request):
+        return self.bulk_remove(Favorite, request)
+
     @decorators.action(
         detail=True,
         methods=['post'],
@@ -89,35 +203,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def remove_from_shopping_cart(self, request, pk=None):
         return self.remove_item(ShoppingList, request, pk)
 
-    @decorators.action(detail=False, methods=['get'])
+    @decorators.action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,),
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(render_recipes(page, request))
+
+    @decorators.action(
+        detail=False,
+        methods=['get'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-summary',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_cart_summary(self, request):
+        totals = ShoppingCartTotal.objects.filter(
+            user=request.user).select_related('ingredient').order_by(
+            'ingredient__name', 'ingredient__measurement_unit')
+        return response.Response(
+            ShoppingCartTotalSerializer(totals, many=True).data)
+
+    @shopping_cart_summary.mapping.post
+    def bulk_shopping_cart(self, request):
+        return self.bulk_add(ShoppingList, request)
+
+    @shopping_cart_summary.mapping.delete
+    def bulk_remove_from_shopping_cart(self, request):
+        return self.bulk_remove(ShoppingList, request)
+
+    @decorators.action(
+        detail=False,
+        methods=['delete'],
+        url_path='shopping_cart/clear',
+        url_name='shopping-cart-clear',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def clear_shopping_cart(self, request):
+        return self.bulk_response(
+            user_lists.remove_recipes(ShoppingList, request.user))
+
+    @decorators.action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(CSVRenderer, PlainTextRenderer, FastJSONRenderer),
+    )
     def download_shopping_cart(self, request):
-        shopping_lists = ShoppingList.objects.filter(user=request.user)
-        recipes = shopping_lists.values_list('recipe', flat=True)
-
-        ingredients = RecipeIngredient.objects.filter(recipe__in=recipes) \
-            .values('ingredient__name', 'ingredient__measurement_unit') \
-            .annotate(total_amount=Sum('amount'))
-
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(['Ingredient', 'Amount', 'Unit'])
-
-        for ingredient in ingredients:
-            writer.writerow([
-                ingredient['ingredient__name'],
-                ingredient['total_amount'],
-                ingredient['ingredient__measurement_unit']
-            ])
-
-        buffer.seek(0)
-        response = io.BytesIO(buffer.getvalue().encode('utf-8'))
-        buffer.close()
-
-        return FileResponse(
-            response,
-            as_attachment=True,
-            filename='shopping_cart.csv'
+        params = ShoppingCartExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        renderer = request.accepted_renderer
+        export = StreamingHttpResponse(
+            export_shopping_cart(request.user, renderer.format,
+                                 **params.validated_data),
+            content_type=f'{renderer.media_type}; charset=utf-8',
         )
+        export['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
+        return export
 
     @decorators.action(
         detail=True,
@@ -126,38 +272,60 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, *args, **kwargs):
         recipe = self.get_object()
-        short_link = recipe.short_link
+        short_link = recipe.get_short_link()
         full_short_link = request.build_absolute_uri(f"/s/{short_link}")
         return response.Response({'short-link': full_short_link})
 
 
 def redirect_recipe(request, link):
-    id = get_object_or_404(Recipe, short_link=link).id
+    try:
+        id = short_links.resolve(link)
+    except LookupError:
+        raise Http404
     link = request.build_absolute_uri(f"/recipes/{id}/")
     return HttpResponseRedirect(link)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_scopes = ('tags',)
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    cache_scopes = ('ingredients',)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = None
 
+    def get_cache_scopes(self, request, *args, **kwargs):
+        if request.query_params.get('ordering') == 'popularity':
+            return ('ingredients', 'recipes')
+        return self.cache_scopes
+
+    def render_list(self, request, *args, **kwargs):
+        params = IngredientSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return response.Response(ingredient_index.search(
+            params.validated_data['name'],
+            limit=params.validated_data['limit'],
+            by_popularity=params.validated_data['ordering'] == 'popularity',
+        ))
+
 
 class CustomUserViewSet(UserViewSet):
     serializer_class = AuthorSerializer
     queryset = CustomUser.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = LimitPageNumberPagination
+    cursor_ordering = ('username', 'id')
 
     @decorators.action(
         detail=False,
@@ -166,16 +334,53 @@ class CustomUserViewSet(UserViewSet):
     def me(self, request, *args, **kwargs):
         return super().me(request, *args, **kwargs)
 
+    def get_recipes_limit(self, request):
+        params = RecipesLimitSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data['recipes_limit']
+
+    def attach_recipes(self, authors, recipes_limit):
+        """Загружает последние рецепты авторов страницы одним запросом.
+
+        Рецепты нумеруются внутри каждого автора оконной функцией
+        ROW_NUMBER(), а отбор первых ``recipes_limit`` делается во внешнем
+        запросе: Django 3.2 не умеет фильтровать по оконным выражениям.
+        """
+        by_author = defaultdict(list)
+        author_ids = [author.pk for author in authors]
+        recipes = Recipe.objects.filter(author_id__in=author_ids)
+        if recipes_limit is None:
+            recipes = recipes.order_by('-pub_date', '-id')
+        elif recipes_limit and author_ids:
+            sql, params = recipes.annotate(author_rank=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )).order_by().query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                f'WHERE author_rank <= %s ORDER BY author_rank',
+                (*params, recipes_limit),
+            )
+        else:
+            recipes = ()
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = by_author[author.pk]
+
     @decorators.action(
         detail=False,
         methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,)
     )
     def subscriptions(self, request):
+        recipes_limit = self.get_recipes_limit(request)
         user_subscriptions = CustomUser.objects.filter(
             followers__user=request.user
-        )
+        ).annotate(is_subscribed=Value(True, output_field=BooleanField()))
         page = self.paginate_queryset(user_subscriptions)
-        recipes_limit = request.query_params.get('recipes_limit', None)
+        self.attach_recipes(page, recipes_limit)
 
         serializer = UserSerializer(
             page,
@@ -193,13 +398,14 @@ class CustomUserViewSet(UserViewSet):
         methods=['post'],
     )
     def subscribe(self, request, id=None):
+        recipes_limit = self.get_recipes_limit(request)
         author = get_object_or_404(CustomUser, id=id)
         data = {'user': request.user.id, 'author': author.id}
 
         serializer = SubscribeSerializer(
             data=data, context={
                 'request': request,
-                'recipes_limit': request.query_params.get('recipes_limit')
+                'recipes_limit': recipes_limit
             }
         )
         serializer.is_valid(raise_exception=True)
@@ -226,6 +432,7 @@ class CustomUserViewSet(UserViewSet):
         detail=False,
         methods=['put'],
         url_path='me/avatar',
+        parser_classes=IMAGE_PARSERS,
     )
     def update_avatar(self, request):
         user = request.user
@@ -247,7 +454,9 @@ class CustomUserViewSet(UserViewSet):
     def delete_avatar(self, request):
         user = request.user
 
-        user.avatar.delete()
+        # Файл удаляется по счетчику ссылок: тот же файл может быть
+        # аватаром другого пользователя или фото рецепта.
+        user.avatar = None
         user.save()
 
         return response.Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,88 @@
+import tempfile
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import FileResponse
+from django.urls import URLPattern
+
+# Методы, которые выполняются в пуле потоков. Запись остается на обычном
+# пути Django: транзакции, обработчики on_commit и разбор загрузок
+# проверены только там.
+ASYNC_METHODS = ('GET', 'HEAD')
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет синхронное представление в потоке пула целиком.
+
+    Соединения с БД принадлежат потоку пула, поэтому закрываются здесь
+    же, как после запроса в WSGI. Ответ DRF рендерится в этом потоке, а
+    потоковый ответ записывается во временный файл: Django 3.2 перебирает
+    потоковый ответ в цикле событий, где обращаться к БД нельзя.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        if response.streaming:
+            response = spool(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def spool(streamed):
+    """Переписывает потоковый ответ во временный файл на диске.
+
+    Цикл событий потом только читает файл, а выгрузка не держится в
+    памяти целиком.
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        for chunk in streamed.streaming_content:
+            file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    finally:
+        streamed.close()
+    size = file.tell()
+    file.seek(0)
+    response = FileResponse(file, status=streamed.status_code)
+    for header, value in streamed.items():
+        response[header] = value
+    response['Content-Length'] = size
+    response.cookies = streamed.cookies
+    return response
+
+
+def async_view(view):
+    """Асинхронная обертка синхронного представления для ASGI.
+
+    Django 3.2 выполняет синхронные представления в одном общем потоке
+    процесса; обертка выполняет запросы ASYNC_METHODS в пуле потоков,
+    поэтому чтения, ждущие БД, не задерживают остальные. Остальные методы
+    выполняются в общем потоке, как без обертки.
+    """
+    run = sync_to_async(run_view, thread_sensitive=False)
+    run_shared = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in ASYNC_METHODS:
+            return await run(view, request, *args, **kwargs)
+        return await run_shared(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_patterns(patterns, names):
+    """Заменяет представления маршрутов с именами ``names`` обертками."""
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
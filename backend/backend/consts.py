@@ -6,6 +6,6 @@ USER_LENGTH = 150
 EMAIL_LENGTH = 254
 SHORT_NAME = 128
 PAGE_SIZE = 6
-SHORT_LINK = 6
 MIN_VALUE = 1
 MAX_VALUE = 32000
+BULK_RECIPES_LIMIT = 100
@@ -0,0 +1,31 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик ``field`` у записи ``model`` на ``delta``."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с числом строк ``queryset``, ссылающихся на внешнюю запись
+    через ``field``."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def recount(queryset, field, expression):
+    """Пересчитывает счетчик ``field`` там, где он разошелся с
+    ``expression``, и возвращает число исправленных записей."""
+    drifted = queryset.annotate(actual=expression).exclude(
+        **{field: F('actual')}).values('pk')
+    return queryset.model.objects.filter(pk__in=drifted).update(
+        **{field: expression})
@@ -0,0 +1,147 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+BACKGROUND = (255, 255, 255)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='image-variants')
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def variant_name(name, variant, extension):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}-{variant}.{extension}')
+
+
+def variant_urls(variants, storage):
+    """Адреса готовых вариантов изображения по размерам и форматам.
+
+    Адреса относительные во всех ответах: списки и страницы рецептов
+    собираются из общего для всех хостов кэша.
+    """
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        if variant not in variants:
+            continue
+        urls[variant] = {}
+        for extension, name in variants[variant].items():
+            urls[variant][extension] = storage.url(name)
+    return urls
+
+
+def encode(image, extension):
+    if extension == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, BACKGROUND)
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, FORMATS[extension], quality=settings.IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def render(field_file):
+    """Сохраняет уменьшенные копии изображения и возвращает их имена.
+
+    Копии не бывают больше оригинала; прозрачный фон в JPEG заменяется
+    белым.
+    """
+    storage = field_file.storage
+    variants = {'source': field_file.name}
+    with field_file.open('rb'), Image.open(field_file) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = ('A' in image.getbands()
+                     or 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants[variant] = {
+                extension: storage.save(
+                    variant_name(field_file.name, variant, extension),
+                    ContentFile(encode(resized, extension)))
+                for extension in FORMATS
+            }
+    return variants
+
+
+def needs_variants(instance, field_name):
+    source = getattr(instance, variants_field(field_name)).get('source')
+    return (getattr(instance, field_name).name or None) != source
+
+
+def process(model, pk, field_name, force=False):
+    """Строит варианты изображения записи и сохраняет их имена.
+
+    Если за время обработки изображение заменили, результат не
+    сохраняется: новое изображение обработает задача, поставленная при его
+    сохранении. Файлы прежних вариантов удаляются вместе со ссылками на них
+    (см. recipes.media).
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not (
+            force or needs_variants(instance, field_name)):
+        return
+    field_file = getattr(instance, field_name)
+    storage = field_file.storage
+    variants = {}
+    if field_file:
+        if not storage.exists(field_file.name):
+            logger.warning('Файл %s не найден.', field_file.name)
+            return
+        try:
+            variants = render(field_file)
+        except (OSError, UnidentifiedImageError):
+            logger.warning('Не удалось обработать %s.', field_file.name,
+                           exc_info=True)
+            variants = {'source': field_file.name}
+
+    attname = variants_field(field_name)
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(
+            pk=pk).values_list(field_name, flat=True).first()
+        if current is None or (current or None) != variants.get(
+                'source'):
+            return
+        setattr(instance, attname, variants)
+        instance.save(update_fields=[attname] + [
+            field.name for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False)
+        ])
+
+
+def run(model, pk, field_name):
+    try:
+        process(model, pk, field_name)
+    except Exception:
+        logger.exception('Ошибка при построении вариантов изображения '
+                         '%s #%s.', model._meta.label, pk)
+    finally:
+        connection.close()
+
+
+def schedule(instance, field_name):
+    """После фиксации транзакции ставит построение вариантов в очередь
+    фоновых потоков, если изображение записи изменилось."""
+    if not needs_variants(instance, field_name):
+        return
+    model, pk = type(instance), instance.pk
+    if settings.IMAGE_VARIANTS_ASYNC:
+        transaction.on_commit(
+            lambda: executor.submit(run, model, pk, field_name))
+    else:
+        transaction.on_commit(lambda: process(model, pk, field_name))
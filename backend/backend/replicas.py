@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = 'primary-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Реплика, из которой читает текущий запрос; None — читать из основной БД.
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+def current_replica():
+    """Реплика для чтения или None, если читать нужно из основной БД.
+
+    Внутри транзакции основной БД чтение идет туда же, где запись.
+    """
+    alias = replica_alias.get()
+    if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return None
+    return alias
+
+
+@contextmanager
+def use_primary():
+    token = replica_alias.set(None)
+    try:
+        yield
+    finally:
+        replica_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Направляет чтение в реплику, выбранную ReplicaMiddleware, а запись
+    и все остальное — в основную БД.
+
+    По умолчанию чтение идет в основную БД, поэтому команды управления и
+    фоновые потоки реплик не касаются.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return current_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # После записи запрос дочитывает данные из основной БД.
+        replica_alias.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Отправляет безопасные запросы читать из реплики.
+
+    После изменяющего запроса клиент DATABASE_REPLICA_LAG секунд читает из
+    основной БД, чтобы видеть свои изменения: признак хранится в cookie и
+    в кэше под ключом из заголовка Authorization.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self.pin(request, response)
+            return response
+        if not settings.DATABASE_REPLICAS or self.is_pinned(request):
+            return self.get_response(request)
+        token = replica_alias.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+
+    async def __acall__(self, request):
+        # Кэш синхронный, поэтому обращения к нему уходят в пул потоков.
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if settings.DATABASE_REPLICAS:
+                await sync_to_async(self.pin, thread_sensitive=False)(
+                    request, response)
+            return response
+        if not settings.DATABASE_REPLICAS or await sync_to_async(
+                self.is_pinned, thread_sensitive=False)(request):
+            return await self.get_response(request)
+        token = replica_alias.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return await self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+
+    def get_pin_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if authorization:
+            return PIN_KEY.format(
+                hashlib.sha256(authorization.encode()).hexdigest())
+        return None
+
+    def is_pinned(self, request):
+        if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            return True
+        key = self.get_pin_key(request)
+        return key is not None and caches[
+            settings.API_CACHE_ALIAS].get(key) is not None
+
+    def pin(self, request, response):
+        if not settings.DATABASE_REPLICAS:
+            return
+        lag = settings.DATABASE_REPLICA_LAG
+        response.set_cookie(settings.REPLICA_PIN_COOKIE, '1', max_age=lag,
+                            httponly=True, samesite='Lax')
+        key = self.get_pin_key(request)
+        if key is not None:
+            caches[settings.API_CACHE_ALIAS].set(key, 1, lag)
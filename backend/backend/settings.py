@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'backend.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,6 +63,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+# wsgi или asgi; в режиме asgi частые запросы на чтение выполняются
+# асинхронными представлениями (см. backend.async_views).
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
 
 DATABASES = {
     'default': {
@@ -73,6 +79,77 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: те же параметры, кроме адреса. В тестах
+# реплики указывают на тестовую основную БД.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.getenv(
+        'DB_REPLICA_HOSTS', '').split(','))):
+    host, _, port = host.strip().partition(':')
+    DATABASE_REPLICAS.append(f'replica{index}')
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+# Секунд, на которые клиент после записи остается на основной БД.
+DATABASE_REPLICA_LAG = int(os.getenv('DB_REPLICA_LAG', 5))
+REPLICA_PIN_COOKIE = 'primary_pin'
+
+# Кэши, которые каждый процесс хранит у себя: запись в одном воркере или
+# команде управления не сбрасывает их в остальных процессах.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+TESTING = sys.argv[1:2] == ['test']
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', (
+    'django.core.cache.backends.locmem.LocMemCache' if TESTING
+    else 'django.core.cache.backends.memcached.PyMemcacheCache'))
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', 'foodgram' if TESTING else 'memcached:11211'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+    }
+}
+# Memcached сам вытесняет записи и не принимает MAX_ENTRIES.
+if not CACHE_BACKEND.startswith('django.core.cache.backends.memcached.'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    }
+
+API_CACHE_ALIAS = os.getenv('API_CACHE_ALIAS', 'default')
+
+INGREDIENT_POPULARITY_TTL = int(os.getenv('INGREDIENT_POPULARITY_TTL', 600))
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+SHORT_LINK_CACHE_TTL = int(os.getenv('SHORT_LINK_CACHE_TTL', 60))
+
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+
+IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'card': 640,
+    'full': 1280,
+}
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_VARIANTS_ASYNC = (
+    os.getenv('IMAGE_VARIANTS_ASYNC', 'True').lower() == 'true')
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 7 * 1024 * 1024))
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,6 +179,8 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+DEFAULT_FILE_STORAGE = 'backend.storage.ContentAddressedStorage'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -129,7 +208,11 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
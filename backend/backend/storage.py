@@ -0,0 +1,44 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именами из SHA-256 содержимого.
+
+    Одинаковые файлы в одном каталоге сохраняются один раз, а имя никогда
+    не указывает на другое содержимое, поэтому /media/ можно кэшировать
+    бессрочно. Ссылки на файлы считает recipes.media, а файлы без ссылок
+    удаляет команда cleanup_media.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # Файл с тем же содержимым успел сохранить другой запрос.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя означает то же содержимое, другое имя не нужно.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
@@ -0,0 +1,45 @@
+from django.db import IntegrityError, connections, router, transaction
+
+# Сколько id передается в одном DELETE: SQLite до 3.32 принимает не больше
+# 999 параметров.
+DELETE_BATCH_SIZE = 500
+
+
+def insert_or_ignore(model, **values):
+    """Создает запись в точке сохранения.
+
+    Возвращает созданный объект или None, если такая запись уже есть:
+    нарушение уникальности откатывает только точку сохранения. Сигналы
+    отправляет обычный save(), поэтому счетчики и кэши обновляются
+    прежними обработчиками.
+    """
+    instance = model(**values)
+    using = router.db_for_write(model, instance=instance)
+    try:
+        with transaction.atomic(using=using):
+            instance.save(force_insert=True, using=using)
+    except IntegrityError:
+        return None
+    return instance
+
+
+def delete_pks(model, pks):
+    """Удаляет строки ``model`` с id из ``pks`` без сигналов и каскадов.
+
+    Только для таблиц, на которые не ссылаются другие таблицы; счетчики
+    и итоги вызывающий код обновляет сам. Возвращает число строк.
+    """
+    pks = list(pks)
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), DELETE_BATCH_SIZE):
+            batch = pks[start:start + DELETE_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {column} IN ({placeholders})',
+                batch)
+            deleted += cursor.rowcount
+    return deleted
@@ -1,9 +1,13 @@
 from api.views import redirect_recipe
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from backend.async_views import async_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:link>/', redirect_recipe),
+    path('s/<str:link>/', async_view(redirect_recipe)
+         if settings.SERVER_MODE == 'asgi' else redirect_recipe),
 ]
@@ -0,0 +1,25 @@
+import os
+
+from django.conf import settings
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+bind = '0.0.0.0:9000'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+# SERVER_MODE=asgi запускает backend.asgi в воркерах uvicorn: медленные
+# клиенты и ожидание БД не занимают воркер целиком.
+if os.getenv('SERVER_MODE', 'wsgi').lower() == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+# Поколения кэша должны быть общими для всех воркеров, иначе запись в
+# одном из них не сбрасывает кэшированные ответы в остальных.
+cache_backend = settings.CACHES[settings.API_CACHE_ALIAS]['BACKEND']
+if workers > 1 and cache_backend in settings.PROCESS_LOCAL_CACHES:
+    raise RuntimeError(
+        f'{cache_backend} хранит кэш в памяти процесса и не подходит для '
+        f'GUNICORN_WORKERS={workers}; укажите общий CACHE_BACKEND, '
+        'например memcached.')
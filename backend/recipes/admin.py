@@ -22,13 +22,14 @@ class RecipeTagInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
 
-    list_display = ('name', 'author', 'get_favorited_count')
+    list_display = ('name', 'author', 'get_favorited_count',
+                    'in_carts_count')
     list_filter = ('tags',)
     inlines = [RecipeIngredientInline]
 
     @admin.display(description='Счетчик добавления в "Избранное" ')
     def get_favorited_count(self, obj):
-        return obj.favorited_by.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,97 @@
+from itertools import islice
+
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import RecipeIngredient, ShoppingCartTotal, ShoppingList
+
+
+def recipes_amount(recipe_ids):
+    """Подзапрос с суммой ингредиента внешней строки по рецептам."""
+    return Subquery(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids,
+        ingredient_id=OuterRef('ingredient_id'),
+    ).order_by().values('ingredient_id').annotate(
+        total=Sum('amount')).values('total'))
+
+
+def carting_users(recipe_id):
+    return list(ShoppingList.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+def add_recipes(recipe_ids, user_ids):
+    """Прибавляет ингредиенты рецептов к итогам пользователей ``user_ids``."""
+    ingredient_ids = list(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values_list(
+        'ingredient_id', flat=True).distinct())
+    if not user_ids or not ingredient_ids:
+        return
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id)
+         for user_id in user_ids for ingredient_id in ingredient_ids),
+        ignore_conflicts=True,
+    )
+    ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=ingredient_ids,
+    ).update(amount=F('amount') + recipes_amount(recipe_ids))
+
+
+def remove_recipes(recipe_ids, user_ids):
+    """Вычитает ингредиенты рецептов из итогов пользователей ``user_ids``."""
+    if not user_ids or not recipe_ids:
+        return
+    totals = ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids,
+        ingredient_id__in=RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values('ingredient_id'),
+    )
+    totals.update(amount=F('amount') - recipes_amount(recipe_ids))
+    ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids, amount=0).delete()
+
+
+def refresh_ingredients(recipe_id, ingredient_ids):
+    """Пересчитывает итоги по ингредиентам у всех, у кого рецепт в корзине.
+
+    Пересчет идемпотентен, поэтому подходит для правок отдельных строк
+    RecipeIngredient, в том числе при каскадном удалении рецепта.
+    """
+    user_ids = carting_users(recipe_id)
+    if not user_ids:
+        return
+    amounts = RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids,
+        recipe__in_shopping_lists__user_id__in=user_ids,
+    ).values('recipe__in_shopping_lists__user_id', 'ingredient_id').annotate(
+        total=Sum('amount')).order_by()
+    ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=ingredient_ids).delete()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(
+            user_id=row['recipe__in_shopping_lists__user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total'],
+        ) for row in amounts
+    )
+
+
+def rebuild(batch_size=1000):
+    """Заново строит итоги всех корзин и возвращает число строк."""
+    ShoppingCartTotal.objects.all().delete()
+    rows = RecipeIngredient.objects.filter(
+        recipe__in_shopping_lists__isnull=False,
+    ).values('recipe__in_shopping_lists__user_id', 'ingredient_id').annotate(
+        total=Sum('amount')).order_by()
+    # Пачками, чтобы не держать в памяти все строки больших наборов данных.
+    total = 0
+    rows = rows.iterator()
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(
+                user_id=row['recipe__in_shopping_lists__user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total'],
+            ) for row in batch
+        )
+        total += len(batch)
+    return total
@@ -0,0 +1,218 @@
+import json
+import random
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+from itertools import accumulate, count
+from math import gcd
+
+from django.db import connection, transaction
+
+from users.models import CustomUser, Subscribe
+
+from .ingredients import CopyStream
+from .models import Favorite, Recipe, RecipeIngredient, ShoppingList
+
+# Файла нет; отметка о готовых вариантах не дает фоновой обработке
+# изображений искать его.
+IMAGE_NAME = 'recipes/images/dataset.png'
+# Записей на один генератор случайных чисел. Размер части в транзакции
+# кратен ему, поэтому данные не зависят ни от размера частей, ни от числа
+# процессов.
+RNG_BLOCK = 1000
+# Шаг перестановки рангов: простое число, взаимно простое почти с любым
+# размером диапазона.
+SCATTER_STEP = 1_000_003
+# Сдвиг рангов перед перестановкой в долях диапазона. Плодовитые авторы и
+# авторы с большим числом подписчиков — разные люди, иначе ленты подписок
+# растут как произведение двух хвостов Ципфа.
+SHIFTS = (0, 0.5)
+AUTHORS, FOLLOWED = range(len(SHIFTS))
+
+Plan = namedtuple('Plan', (
+    'seed', 'users', 'recipes', 'first_user', 'first_recipe',
+    'ingredient_ids', 'tag_ids', 'ingredients_per_recipe', 'favorites',
+    'cart', 'subscriptions', 'exponent', 'end', 'days', 'password',
+    'chunk_size',
+))
+
+
+@lru_cache(maxsize=None)
+def zipf_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для рангов 0..size-1."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+@lru_cache(maxsize=None)
+def scatter_step(size):
+    return next(step for step in count(SCATTER_STEP, 2)
+                if gcd(step, size) == 1)
+
+
+def zipf_sample(rng, size, exponent, k, kind=AUTHORS):
+    """Ранги ``k`` записей из ``size`` по закону Ципфа.
+
+    Ранги переставляются взаимно однозначно, поэтому популярные записи
+    разбросаны по всему диапазону, а не идут подряд с начала.
+    """
+    step = scatter_step(size)
+    shift = int(size * SHIFTS[kind])
+    return [(rank + shift) % size * step % size for rank in rng.choices(
+        range(size), cum_weights=zipf_weights(size, exponent), k=k)]
+
+
+def zipf_distinct(rng, size, exponent, k, kind=AUTHORS, exclude=None):
+    """До ``k`` разных рангов по закону Ципфа, кроме ``exclude``."""
+    k = min(k, size - (exclude is not None))
+    chosen = set()
+    # Популярные ранги выпадают часто, поэтому выборка повторяется, пока не
+    # наберется нужное число разных значений или не кончатся попытки.
+    for _ in range(10):
+        chosen.update(
+            zipf_sample(rng, size, exponent, k - len(chosen), kind))
+        chosen.discard(exclude)
+        if len(chosen) >= k:
+            break
+    return sorted(chosen)
+
+
+def get_blocks(plan, step, total, chunk):
+    """Пары (генератор, диапазон индексов) для блоков части ``chunk``."""
+    start = chunk * plan.chunk_size
+    stop = min(start + plan.chunk_size, total)
+    for block_start in range(start, stop, RNG_BLOCK):
+        yield (random.Random(
+            f'{plan.seed}:{step}:{block_start // RNG_BLOCK}'),
+            range(block_start, min(block_start + RNG_BLOCK, stop)))
+
+
+def insert(model, fields, rows):
+    """Вставляет кортежи значений полей ``fields`` в таблицу ``model``.
+
+    Остальные поля получают значения по умолчанию модели. ORM здесь не
+    используется: на миллионах строк подготовка каждого значения дольше
+    самой вставки. В PostgreSQL строки передаются через COPY.
+    """
+    opts = model._meta
+    default = model()
+    rest = [field for field in opts.local_concrete_fields
+            if field.attname not in fields and field is not opts.auto_field]
+    tail = tuple(field.get_db_prep_save(getattr(default, field.attname),
+                                        connection)
+                 for field in rest)
+    columns = ', '.join(connection.ops.quote_name(column) for column in (
+        [opts.get_field(name).column for name in fields]
+        + [field.column for field in rest]))
+    table = connection.ops.quote_name(opts.db_table)
+    rows = (row + tail for row in rows)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                CopyStream(rows))
+        else:
+            placeholders = ', '.join(['%s'] * (len(fields) + len(rest)))
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                rows)
+
+
+def adapt(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def generate_users(plan, chunk):
+    joined = adapt(plan.end - timedelta(days=plan.days))
+    users = []
+    for _, indexes in get_blocks(plan, 'users', plan.users, chunk):
+        for index in indexes:
+            user_id = plan.first_user + index
+            users.append((
+                user_id, f'dataset{user_id}@example.com',
+                f'dataset{user_id}', 'Имя', 'Фамилия', plan.password,
+                joined,
+            ))
+    insert(CustomUser, (
+        'id', 'email', 'username', 'first_name', 'last_name', 'password',
+        'date_joined',
+    ), users)
+
+
+def generate_recipes(plan, chunk):
+    span = timedelta(days=plan.days) / plan.recipes
+    variants = json.dumps({'source': IMAGE_NAME})
+    low, high = plan.ingredients_per_recipe
+    recipes, ingredients, tags = [], [], []
+    for rng, indexes in get_blocks(plan, 'recipes', plan.recipes, chunk):
+        authors = zipf_sample(rng, plan.users, plan.exponent, len(indexes))
+        for index, author in zip(indexes, authors):
+            recipe_id = plan.first_recipe + index
+            # id растет вместе с датой публикации, как у настоящих рецептов.
+            published = adapt(plan.end - span * (plan.recipes - index))
+            recipes.append((
+                recipe_id, f'Рецепт {recipe_id}', plan.first_user + author,
+                IMAGE_NAME, variants, 'Описание', rng.randint(1, 180),
+                published, published,
+            ))
+            for ingredient_id in rng.sample(
+                    plan.ingredient_ids,
+                    min(rng.randint(low, high), len(plan.ingredient_ids))):
+                ingredients.append(
+                    (recipe_id, ingredient_id, rng.randint(1, 500)))
+            for tag_id in rng.sample(
+                    plan.tag_ids, min(rng.randint(1, 3), len(plan.tag_ids))):
+                tags.append((recipe_id, tag_id))
+    insert(Recipe, (
+        'id', 'name', 'author_id', 'image', 'image_variants', 'text',
+        'cooking_time', 'pub_date', 'updated_at',
+    ), recipes)
+    insert(RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount'),
+           ingredients)
+    insert(Recipe.tags.through, ('recipe_id', 'tag_id'), tags)
+
+
+def generate_relations(plan, chunk):
+    """Избранное, корзины и подписки пользователей части ``chunk``."""
+    span = timedelta(days=plan.days).total_seconds()
+    favorites, carts, subscriptions = [], [], []
+    for rng, indexes in get_blocks(plan, 'relations', plan.users, chunk):
+        for index in indexes:
+            user_id = plan.first_user + index
+            for rank in zipf_distinct(rng, plan.recipes, plan.exponent,
+                                      rng.randint(0, plan.favorites * 2)):
+                favorites.append((
+                    user_id, plan.first_recipe + rank,
+                    adapt(plan.end - timedelta(
+                        seconds=rng.random() * span)),
+                ))
+            for rank in zipf_distinct(rng, plan.recipes, plan.exponent,
+                                      rng.randint(0, plan.cart * 2)):
+                carts.append((user_id, plan.first_recipe + rank))
+            for rank in zipf_distinct(
+                    rng, plan.users, plan.exponent,
+                    rng.randint(0, plan.subscriptions * 2),
+                    FOLLOWED, exclude=index):
+                subscriptions.append((user_id, plan.first_user + rank))
+    insert(Favorite, ('user_id', 'recipe_id', 'added_at'), favorites)
+    insert(ShoppingList, ('user_id', 'recipe_id'), carts)
+    insert(Subscribe, ('user_id', 'author_id'), subscriptions)
+
+
+STEPS = (
+    ('users', generate_users),
+    ('recipes', generate_recipes),
+    ('relations', generate_relations),
+)
+GENERATORS = dict(STEPS)
+
+
+def chunk_count(plan, step):
+    total = plan.recipes if step == 'recipes' else plan.users
+    return -(-total // plan.chunk_size)
+
+
+def run_chunk(plan, step, chunk):
+    with transaction.atomic():
+        GENERATORS[step](plan, chunk)
+    return step, chunk
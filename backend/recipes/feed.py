@@ -0,0 +1,86 @@
+from itertools import islice
+
+from django.conf import settings
+
+from users.models import CustomUser, Subscribe
+
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def is_popular(author_id):
+    """Рецепты автора с числом подписчиков от FEED_FANOUT_LIMIT не
+    раскладываются по лентам, а подмешиваются при чтении.
+
+    Рецепты, опубликованные, пока автор был популярным, в ленты не
+    попадают и после того, как подписчиков стало меньше порога; их можно
+    восстановить командой recount_counters.
+    """
+    return CustomUser.objects.filter(
+        pk=author_id,
+        followers_count__gte=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def popular_author_ids(user):
+    return list(CustomUser.objects.filter(
+        followers__user=user,
+        followers_count__gte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('id', flat=True))
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if is_popular(recipe.author_id):
+        return
+    followers = Subscribe.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   author_id=recipe.author_id, pub_date=recipe.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные рецепты автора."""
+    if is_popular(author_id):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   author_id=author_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заново строит ленты всех пользователей и возвращает число записей."""
+    FeedEntry.objects.all().delete()
+    popular = CustomUser.objects.filter(
+        followers_count__gte=settings.FEED_FANOUT_LIMIT).values('id')
+    rows = Recipe.objects.filter(
+        author__followers__isnull=False,
+    ).exclude(author_id__in=popular).values_list(
+        'author__followers__user_id', 'id', 'author_id', 'pub_date')
+    # Записи создаются пачками: bulk_create держит в памяти все объекты,
+    # а на больших наборах данных их десятки миллионов.
+    total = 0
+    rows = rows.iterator()
+    for batch in iter(lambda: list(islice(rows, BATCH_SIZE)), []):
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+            for user_id, recipe_id, author_id, pub_date in batch)
+        total += len(batch)
+    return total
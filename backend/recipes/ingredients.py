@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .models import Ingredient
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+STAGING_TABLE = 'ingredient_staging'
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for line, row in enumerate(csv.reader(file), 1):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise ValueError(f'Строка {line}: ожидалось два поля, '
+                             f'получено {len(row)}.')
+        yield row
+
+
+def read_json(file):
+    """Читает массив объектов JSON по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидался массив JSON.')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise ValueError('Массив JSON не закончен.')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if not isinstance(item, dict):
+            raise ValueError(f'Ожидался объект, получено: {item!r}.')
+        yield item.get('name'), item.get('measurement_unit')
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def read_ingredients(file, file_format):
+    """Пары (название, единица измерения) из файла csv или json."""
+    max_lengths = [Ingredient._meta.get_field(field).max_length
+                   for field in ('name', 'measurement_unit')]
+    for row in READERS[file_format](file):
+        values = tuple(str(value or '').strip() for value in row)
+        if not all(values):
+            raise ValueError(f'Пустое поле: {row!r}.')
+        for value, max_length in zip(values, max_lengths):
+            if len(value) > max_length:
+                raise ValueError(
+                    f'Длиннее {max_length} символов: {value!r}.')
+        yield values
+
+
+class CopyStream(io.TextIOBase):
+    """Файл для COPY FROM STDIN: строки CSV из ``rows`` по мере чтения."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+        data = self.buffer.getvalue()
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+        else:
+            rest = ''
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.buffer.write(rest)
+        return data
+
+
+def copy_ingredients(rows):
+    """Загружает строки через COPY во временную таблицу и переносит новые
+    одним INSERT ... ON CONFLICT по ограничению unique_ingredient_unit."""
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    stream = CopyStream(rows)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+            '(name text, measurement_unit text) ON COMMIT DROP')
+        cursor.copy_expert(
+            f'COPY {STAGING_TABLE} (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)', stream)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM {STAGING_TABLE} '
+            'ON CONFLICT ON CONSTRAINT unique_ingredient_unit DO NOTHING')
+        inserted = cursor.rowcount
+    return inserted, stream.count - inserted
+
+
+def bulk_create_ingredients(rows):
+    total = 0
+    before = Ingredient.objects.count()
+    rows = iter(rows)
+    for batch in iter(lambda: list(islice(rows, BATCH_SIZE)), []):
+        total += len(batch)
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            ignore_conflicts=True)
+    inserted = Ingredient.objects.count() - before
+    return inserted, total - inserted
+
+
+@transaction.atomic
+def load_ingredients(rows):
+    """Добавляет ингредиенты, которых еще нет в БД.
+
+    Возвращает число добавленных и пропущенных строк. Сигналы не
+    отправляются, поэтому кэши ингредиентов сбрасывает вызывающий код.
+    """
+    if connection.vendor == 'postgresql':
+        return copy_ingredients(rows)
+    return bulk_create_ingredients(rows)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from backend import images
+from recipes.models import Recipe
+from users.models import CustomUser
+
+IMAGE_FIELDS = (
+    (Recipe, 'image'),
+    (CustomUser, 'avatar'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные варианты фото рецептов и аватаров, у '
+            'которых их еще нет или которые устарели.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить варианты всех изображений.')
+
+    def handle(self, *args, **options):
+        for model, field_name in IMAGE_FIELDS:
+            attname = images.variants_field(field_name)
+            queryset = model.objects.exclude(
+                **{f'{field_name}__isnull': True}).exclude(
+                **{field_name: ''}).values_list('pk', field_name, attname)
+            built = 0
+            for pk, name, variants in queryset.iterator():
+                if options['force'] or variants.get('source') != name:
+                    images.process(model, pk, field_name, options['force'])
+                    built += 1
+            self.stdout.write(
+                f'{model._meta.model_name}.{field_name}: '
+                f'обработано изображений {built}.')
@@ -0,0 +1,69 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes import media
+from recipes.models import MediaFile
+
+
+def walk(directory):
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает ссылки на медиафайлы и удаляет файлы фото '
+            'рецептов, аватаров и их вариантов, на которые никто не '
+            'ссылается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Не трогать файлы, освобожденные или созданные менее '
+                 'стольких минут назад: их могут загрузить заново или они '
+                 'принадлежат еще не сохраненным записям.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f'Файлов со ссылками: {media.rebuild()}.')
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+        tracked = set(MediaFile.objects.values_list('name', flat=True))
+        deleted = self.delete_released(threshold, options['dry_run'])
+        for model, field_name in media.MEDIA_FIELDS.items():
+            directory = model._meta.get_field(field_name).upload_to
+            for name in walk(directory.rstrip('/')):
+                if (name in tracked
+                        or default_storage.get_modified_time(
+                            name) > threshold):
+                    continue
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                deleted += 1
+        self.stdout.write(
+            ('Будет удалено' if options['dry_run'] else 'Удалено')
+            + f' файлов: {deleted}.')
+
+    def delete_released(self, threshold, dry_run):
+        """Удаляет файлы, на которые нет ссылок дольше порога."""
+        released = MediaFile.objects.filter(
+            references=0, released_at__lt=threshold)
+        if dry_run:
+            return released.count()
+        deleted = 0
+        for name in released.values_list('name', flat=True).iterator():
+            # Запись удаляется, только если ссылка не появилась снова.
+            with transaction.atomic():
+                if released.filter(name=name).delete()[0]:
+                    default_storage.delete(name)
+                    deleted += 1
+        return deleted
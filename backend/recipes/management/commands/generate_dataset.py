@@ -0,0 +1,144 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import PROCESS_LOCAL_WARNING, bump_generations, is_process_local
+from recipes.dataset import RNG_BLOCK, STEPS, Plan, chunk_count, run_chunk
+from recipes.ingredients import load_ingredients, read_ingredients
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+from .load_ingredients import DEFAULT_PATH
+
+PASSWORD = 'dataset-password'
+TAGS = 8
+
+
+class Command(BaseCommand):
+    help = ('Добавляет в БД синтетические данные для замеров на больших '
+            'объемах: пользователей, рецепты, избранное, корзины и подписки '
+            'с популярностью по закону Ципфа. При одном зерне данные '
+            'одинаковы при любом числе процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя '
+                                 'в среднем.')
+        parser.add_argument('--cart', type=int, default=3,
+                            help='Рецептов в корзине у пользователя '
+                                 'в среднем.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок у пользователя в среднем.')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения популярности '
+                                 'авторов и рецептов.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить даты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=10_000,
+                            help='Записей в одной транзакции; '
+                                 f'округляется вверх до кратного '
+                                 f'{RNG_BLOCK}.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Параллельных процессов; для SQLite '
+                                 'всегда 1.')
+        parser.add_argument('--skip-recount', action='store_true',
+                            help='Не пересчитывать счетчики и итоги.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы два пользователя и один '
+                               'рецепт.')
+        started = time.perf_counter()
+        plan = self.make_plan(options)
+        workers = options['workers']
+        if connection.vendor == 'sqlite':
+            # SQLite допускает одного пишущего, процессы только ждали бы
+            # друг друга.
+            workers = 1
+        for step, _ in STEPS:
+            step_started = time.perf_counter()
+            tasks = range(chunk_count(plan, step))
+            if workers > 1:
+                # Дочерние процессы не должны унаследовать соединения.
+                connections.close_all()
+                with ProcessPoolExecutor(
+                        workers, initializer=django.setup) as pool:
+                    list(pool.map(run_chunk, [plan] * len(tasks),
+                                  [step] * len(tasks), tasks))
+            else:
+                for chunk in tasks:
+                    run_chunk(plan, step, chunk)
+            self.stdout.write(
+                f'{step}: частей {len(tasks)} за '
+                f'{time.perf_counter() - step_started:.1f} с.')
+        self.reset_sequences()
+        if not options['skip_recount']:
+            recount_started = time.perf_counter()
+            call_command('recount_counters', stdout=io.StringIO())
+            self.stdout.write(
+                f'Счетчики пересчитаны за '
+                f'{time.perf_counter() - recount_started:.1f} с.')
+        # Вставка идет в обход сигналов, поэтому поколения кэшей
+        # увеличиваются здесь; серверы видят это только при общем кэше.
+        bump_generations('ingredients', 'recipes')
+        if is_process_local():
+            self.stderr.write(self.style.WARNING(PROCESS_LOCAL_WARNING))
+        self.stdout.write(
+            f'Добавлено пользователей: {plan.users}, рецептов: '
+            f'{plan.recipes} за {time.perf_counter() - started:.1f} с.')
+
+    def make_plan(self, options):
+        if not Ingredient.objects.exists():
+            with open(DEFAULT_PATH, encoding='utf-8', newline='') as file:
+                load_ingredients(read_ingredients(file, 'csv'))
+        Tag.objects.bulk_create(
+            (Tag(name=f'Тег {index}', slug=f'tag-{index}')
+             for index in range(TAGS)),
+            ignore_conflicts=True)
+        # id идут сразу после существующих, поэтому данные можно добавлять
+        # в непустую БД, а части не зависят друг от друга.
+        last_user = CustomUser.objects.aggregate(last=Max('id'))['last']
+        last_recipe = Recipe.objects.aggregate(last=Max('id'))['last']
+        return Plan(
+            seed=options['seed'],
+            users=options['users'],
+            recipes=options['recipes'],
+            first_user=(last_user or 0) + 1,
+            first_recipe=(last_recipe or 0) + 1,
+            ingredient_ids=sorted(
+                Ingredient.objects.values_list('id', flat=True)),
+            tag_ids=sorted(Tag.objects.values_list('id', flat=True)),
+            ingredients_per_recipe=(3, 10),
+            favorites=options['favorites'],
+            cart=options['cart'],
+            subscriptions=options['subscriptions'],
+            exponent=options['zipf'],
+            end=timezone.now(),
+            days=options['days'],
+            password=make_password(PASSWORD),
+            # Части состоят из целых блоков генератора случайных чисел.
+            chunk_size=max(-(-options['chunk_size'] // RNG_BLOCK), 1)
+            * RNG_BLOCK,
+        )
+
+    def reset_sequences(self):
+        # Заданные явно id не продвигают последовательности PostgreSQL.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [CustomUser, Recipe])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
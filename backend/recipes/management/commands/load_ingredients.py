@@ -0,0 +1,47 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import PROCESS_LOCAL_WARNING, bump_generations, is_process_local
+from recipes.ingredients import READERS, load_ingredients, read_ingredients
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из файла csv (название,единица) или json '
+            '(массив объектов name и measurement_unit). Ингредиенты, которые '
+            'уже есть в БД, пропускаются, поэтому команду можно запускать '
+            'повторно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH))
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла {path.name}; укажите --format.')
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                inserted, skipped = load_ingredients(
+                    read_ingredients(file, file_format))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        if inserted:
+            # Массовая вставка не отправляет сигналы, поэтому поколения
+            # кэшей ингредиентов и рецептов увеличиваются здесь. Серверы
+            # видят это, только если кэш общий, например memcached.
+            bump_generations('ingredients', 'recipes')
+            if is_process_local():
+                self.stderr.write(self.style.WARNING(PROCESS_LOCAL_WARNING))
+        self.stdout.write(
+            f'Добавлено ингредиентов: {inserted}, пропущено: {skipped} '
+            f'за {time.perf_counter() - started:.2f} с.')
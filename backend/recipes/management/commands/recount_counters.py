@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.counters import count_subquery, recount
+from recipes import cart_totals, feed, media
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import CustomUser, Subscribe
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Subscribe, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, корзин, рецептов и '
+            'подписчиков, исправляет расхождения и заново строит итоги '
+            'списков покупок, ленты подписок и счетчики ссылок на '
+            'медиафайлы.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                fixed = recount(
+                    model.objects.all(),
+                    field,
+                    count_subquery(related_model.objects.all(),
+                                   related_field),
+                )
+                self.stdout.write(
+                    f'{model._meta.model_name}.{field}: '
+                    f'исправлено записей {fixed}.')
+            self.stdout.write(
+                f'Итоги списков покупок: строк {cart_totals.rebuild()}.')
+            self.stdout.write(f'Ленты подписок: записей {feed.rebuild()}.')
+            self.stdout.write(
+                f'Ссылки на медиафайлы: файлов {media.rebuild()}.')
@@ -0,0 +1,112 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from backend.images import variants_field
+from users.models import CustomUser
+
+from .models import MediaFile, Recipe
+
+MEDIA_FIELDS = {
+    Recipe: 'image',
+    CustomUser: 'avatar',
+}
+BATCH_SIZE = 1000
+
+
+def referenced_names(name, variants):
+    """Файлы, на которые ссылается запись: изображение и его варианты."""
+    names = {name} if name else set()
+    for variant, files in variants.items():
+        if variant != 'source':
+            names.update(files.values())
+    return names
+
+
+def tracks(model, update_fields):
+    """Меняет ли сохранение с ``update_fields`` набор файлов записи."""
+    field_name = MEDIA_FIELDS[model]
+    return update_fields is None or bool(
+        {field_name, variants_field(field_name)} & set(update_fields))
+
+
+def stored_names(model, pk):
+    field_name = MEDIA_FIELDS[model]
+    row = model.objects.filter(pk=pk).values_list(
+        field_name, variants_field(field_name)).first()
+    return referenced_names(*row) if row else set()
+
+
+def instance_names(instance):
+    field_name = MEDIA_FIELDS[type(instance)]
+    return referenced_names(
+        getattr(instance, field_name).name,
+        getattr(instance, variants_field(field_name)),
+    )
+
+
+def acquire(names):
+    if not names:
+        return
+    # Новые записи появляются с нулем ссылок и видны другим транзакциям
+    # только вместе с увеличением счетчика.
+    with transaction.atomic(savepoint=False):
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name) for name in names], ignore_conflicts=True)
+        MediaFile.objects.filter(name__in=names).update(
+            references=F('references') + 1, released_at=None)
+
+
+def release(names):
+    """Уменьшает число ссылок на файлы.
+
+    Файлы здесь не удаляются: одинаковое изображение могут в это же время
+    загрузить заново, и хранилище не станет записывать файл, который еще
+    есть на диске. Файлы без ссылок удаляет команда cleanup_media, когда
+    с момента освобождения пройдет заданное время.
+    """
+    if not names:
+        return
+    with transaction.atomic(savepoint=False):
+        MediaFile.objects.filter(
+            name__in=names, references__gt=0,
+        ).update(references=F('references') - 1)
+        MediaFile.objects.filter(
+            name__in=names, references=0, released_at__isnull=True,
+        ).update(released_at=timezone.now())
+
+
+def replace(previous, current):
+    acquire(current - previous)
+    release(previous - current)
+
+
+def rebuild():
+    """Заново считает ссылки на файлы и возвращает число файлов со ссылками.
+
+    Файлы, на которые ссылок не осталось, сохраняют время освобождения.
+    """
+    counts = Counter()
+    for model, field_name in MEDIA_FIELDS.items():
+        rows = model.objects.values_list(
+            field_name, variants_field(field_name))
+        for name, variants in rows.iterator():
+            counts.update(referenced_names(name, variants))
+    existing = dict(MediaFile.objects.values_list('name', 'id'))
+    MediaFile.objects.filter(references__gt=0).update(
+        references=0, released_at=timezone.now())
+    MediaFile.objects.bulk_update(
+        (MediaFile(id=existing[name], references=references,
+                   released_at=None)
+         for name, references in counts.items() if name in existing),
+        ('references', 'released_at'),
+        batch_size=BATCH_SIZE,
+    )
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=references)
+         for name, references in counts.items() if name not in existing),
+        batch_size=BATCH_SIZE,
+    )
+    return len(counts)
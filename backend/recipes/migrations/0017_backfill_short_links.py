@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+from recipes.short_links import encode
+
+
+def backfill_short_links(apps, schema_editor):
+    """Пустые и повторяющиеся ссылки заменяются кодом id рецепта.
+
+    Из рецептов с одинаковой ссылкой ее сохраняет самый старый, чтобы уже
+    розданные ссылки продолжали вести туда же, куда вели раньше.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    seen = set()
+    for recipe_id, link in Recipe.objects.order_by('id').values_list(
+            'id', 'short_link').iterator():
+        if link and link not in seen:
+            seen.add(link)
+            continue
+        Recipe.objects.filter(id=recipe_id).update(short_link=encode(recipe_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(editable=False, max_length=128, null=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(backfill_short_links, migrations.RunPython.noop),
+    ]
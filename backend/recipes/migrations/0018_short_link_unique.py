@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_backfill_short_links'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(editable=False, max_length=128, null=True, unique=True, verbose_name='Короткая ссылка'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    rows = RecipeIngredient.objects.filter(
+        recipe__in_shopping_lists__isnull=False,
+    ).values('recipe__in_shopping_lists__user_id', 'ingredient_id').annotate(
+        total=Sum('amount')).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(
+            user_id=row['recipe__in_shopping_lists__user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total'],
+        ) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_shopping_cart_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
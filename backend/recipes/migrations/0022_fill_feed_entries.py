@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_feed_entries(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    popular = CustomUser.objects.filter(
+        followers_count__gte=settings.FEED_FANOUT_LIMIT).values('id')
+    rows = Recipe.objects.filter(
+        author__followers__isnull=False,
+    ).exclude(author_id__in=popular).values_list(
+        'author__followers__user_id', 'id', 'author_id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   author_id=author_id, pub_date=pub_date)
+         for user_id, recipe_id, author_id, pub_date in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_feed_entries'),
+        ('users', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def referenced_names(name, variants):
+    names = {name} if name else set()
+    for variant, files in variants.items():
+        if variant != 'source':
+            names.update(files.values())
+    return names
+
+
+def fill_media_files(apps, schema_editor):
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    counts = Counter()
+    for model, field_name in ((apps.get_model('recipes', 'Recipe'), 'image'),
+                              (apps.get_model('users', 'CustomUser'),
+                               'avatar')):
+        rows = model.objects.values_list(field_name, f'{field_name}_variants')
+        for name, variants in rows.iterator():
+            counts.update(referenced_names(name, variants))
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=references)
+         for name, references in counts.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_avatar_variants'),
+        ('recipes', '0024_media_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
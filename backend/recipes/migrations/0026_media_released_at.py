@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_fill_media_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='released_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Ссылок не осталось'),
+        ),
+    ]
@@ -1,12 +1,11 @@
-import random
-import string
-
 from django.core import validators
 from django.db import models
 
-from users.models import CustomUser
 from backend.consts import (BASE_NAME_LENGTH, BASE_SLUG_LEGHT, BASE_UTIL_LEGHT,
-                            MAX_VALUE, MIN_VALUE, SHORT_LINK, SHORT_NAME)
+                            MAX_VALUE, MIN_VALUE, SHORT_NAME)
+from users.models import CustomUser
+
+from . import short_links
 
 
 class Ingredient(models.Model):
@@ -75,6 +74,11 @@ class Recipe(models.Model):
         null=True,
         default=None,
     )
+    image_variants = models.JSONField(
+        'Варианты фото',
+        default=dict,
+        editable=False,
+    )
     text = models.TextField(
         'Текст',
         default='Описание отсутствует',
@@ -101,9 +105,24 @@ class Recipe(models.Model):
         ]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     short_link = models.CharField(
         'Короткая ссылка',
-        max_length=SHORT_NAME,)
+        max_length=SHORT_NAME,
+        unique=True,
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
@@ -114,18 +133,10 @@ class Recipe(models.Model):
     def __str__(self) -> str:
         return self.name
 
-    def save(self, *args, **kwargs):
-        if not self.short_link:
-            self.short_link = self.get_short_link()
-        return super().save(*args, **kwargs)
-
     def get_short_link(self):
-        letters = string.ascii_uppercase
-        while True:
-            rand_string = ''.join(random.choice(letters)
-                                  for _ in range(SHORT_LINK))
-            if not Recipe.objects.filter(short_link=rand_string).exists():
-                return rand_string
+        """Ссылка новых рецептов вычисляется по id, в столбце short_link
+        хранятся только ранее выданные ссылки."""
+        return self.short_link or short_links.encode(self.pk)
 
 
 class RecipeIngredient(models.Model):
@@ -208,3 +219,107 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingCartTotal(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя.
+
+    Таблица поддерживается сигналами при изменении корзины и состава
+    рецептов (см. recipes.cart_totals).
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_totals'
+    )
+    amount = models.PositiveIntegerField('Количество', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_total'
+            )
+        ]
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} ({self.amount})'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Записи создаются при публикации рецепта и при подписке (см.
+    recipes.feed). Дата публикации продублирована, чтобы страница ленты
+    читалась по индексу без обращения к таблице рецептов.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_page'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_author'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class MediaFile(models.Model):
+    """Число ссылок на файл из хранилища.
+
+    Одинаковые изображения хранятся одним файлом (см.
+    backend.storage), поэтому файл удаляется, только когда на него не
+    ссылается ни одно фото рецепта, аватар или их варианты (см.
+    recipes.media), и не сразу, а командой cleanup_media.
+    """
+
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+    released_at = models.DateTimeField(
+        'Ссылок не осталось', null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
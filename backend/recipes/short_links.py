@@ -0,0 +1,69 @@
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(ALPHABET)
+MAX_RECIPE_ID = 2 ** 63 - 1
+
+
+def encode(recipe_id):
+    """Короткая ссылка по id рецепта.
+
+    Кодирование взаимно однозначно, поэтому ссылки не пересекаются, их не
+    нужно хранить и проверять запросами к БД. Старые ссылки состоят из
+    заглавных латинских букв и с новыми совпасть не могут.
+    """
+    if recipe_id < 0:
+        raise ValueError('Отрицательный id рецепта.')
+    link = ''
+    while True:
+        recipe_id, digit = divmod(recipe_id, BASE)
+        link = ALPHABET[digit] + link
+        if not recipe_id:
+            return link
+
+
+def decode(link):
+    """Id рецепта по ссылке из encode или None для любой другой ссылки."""
+    recipe_id = 0
+    for char in link:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        recipe_id = recipe_id * BASE + digit
+    if recipe_id > MAX_RECIPE_ID or encode(recipe_id) != link:
+        return None
+    return recipe_id
+
+
+def resolve(link):
+    """Id рецепта по короткой ссылке; LookupError, если рецепта нет.
+
+    Ссылка рецепта не меняется, но рецепт могут удалить в другом процессе,
+    поэтому найденная ссылка хранится в кэше процесса не дольше
+    SHORT_LINK_CACHE_TTL секунд.
+    """
+    return resolve_cached(
+        link, int(time.monotonic() // settings.SHORT_LINK_CACHE_TTL))
+
+
+@lru_cache(maxsize=settings.SHORT_LINK_CACHE_SIZE)
+def resolve_cached(link, period):
+    """Найденные ссылки хранятся в LRU-кэше процесса до конца периода
+    ``period``; записи прошлых периодов больше не запрашиваются и
+    вытесняются. Исключения lru_cache не запоминает, поэтому промахи не
+    занимают место в кэше.
+    """
+    from .models import Recipe
+
+    recipe_id = decode(link)
+    if recipe_id is None:
+        recipes = Recipe.objects.filter(short_link=link)
+    else:
+        recipes = Recipe.objects.filter(pk=recipe_id)
+    recipe_id = recipes.values_list('id', flat=True).first()
+    if recipe_id is None:
+        raise LookupError(link)
+    return recipe_id
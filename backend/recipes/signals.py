@@ -0,0 +1,127 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from backend import images
+from backend.counters import change_counter
+from users.models import CustomUser, Subscribe
+
+from . import cart_totals, feed, media, short_links
+from .models import Favorite, Recipe, RecipeIngredient, ShoppingList
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(CustomUser, instance.author_id, 'recipes_count', 1)
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        images.schedule(instance, 'image')
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=CustomUser)
+def media_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance.previous_media = None
+    if not raw and media.tracks(sender, update_fields):
+        instance.previous_media = (
+            media.stored_names(sender, instance.pk) if instance.pk else set())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=CustomUser)
+def media_saved(sender, instance, **kwargs):
+    if getattr(instance, 'previous_media', None) is not None:
+        media.replace(instance.previous_media, media.instance_names(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=CustomUser)
+def media_deleted(sender, instance, **kwargs):
+    media.release(media.instance_names(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(CustomUser, instance.author_id, 'recipes_count', -1)
+    short_links.resolve_cached.cache_clear()
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+        cart_totals.add_recipes([instance.recipe_id], [instance.user_id])
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleting(sender, instance, **kwargs):
+    # pre_delete приходит до любых удалений каскада, поэтому состав
+    # рецепта здесь еще на месте, даже если удаляется сам рецепт.
+    cart_totals.remove_recipes([instance.recipe_id], [instance.user_id])
+
+
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(sender, instance, **kwargs):
+    instance.previous_ingredient_id = None
+    if instance.pk:
+        instance.previous_ingredient_id = RecipeIngredient.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', flat=True).first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_cart_totals(sender, instance, **kwargs):
+    ingredient_ids = {instance.ingredient_id,
+                      getattr(instance, 'previous_ingredient_id', None)}
+    cart_totals.refresh_ingredients(
+        instance.recipe_id, ingredient_ids - {None})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if not action.startswith('post_') or (reverse and not pk_set):
+        return
+    Recipe.objects.filter(
+        pk__in=pk_set if reverse else [instance.pk]
+    ).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_feed_backfill(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_feed_prune(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
@@ -0,0 +1,95 @@
+from django.db import transaction
+
+from backend.counters import count_subquery, recount
+from backend.upserts import delete_pks
+from users.models import CustomUser
+
+from . import cart_totals
+from .models import Favorite, Recipe, ShoppingList
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingList: 'in_carts_count',
+}
+
+ADDED = 'added'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+REMOVED = 'removed'
+MISSING = 'missing'
+
+
+def lock_user(user_id):
+    """Блокирует строку пользователя до конца транзакции, чтобы изменения
+    избранного и корзины одного пользователя, в том числе одиночные,
+    выполнялись по очереди."""
+    list(CustomUser.objects.select_for_update().filter(
+        pk=user_id).values_list('pk', flat=True))
+
+
+def recount_recipes(model, recipe_ids):
+    recount(
+        Recipe.objects.filter(pk__in=recipe_ids),
+        COUNTERS[model],
+        count_subquery(model.objects.all(), 'recipe'),
+    )
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину пользователя.
+
+    Строки вставляются одним bulk_create без сигналов, поэтому счетчики
+    рецептов и итоги корзины обновляются здесь же. Одиночные добавления и
+    удаления берут ту же блокировку пользователя, поэтому набор уже
+    добавленных рецептов не меняется до конца транзакции и ни один рецепт
+    не учитывается дважды. Возвращает статус для каждого id.
+    """
+    lock_user(user.pk)
+    found = set(Recipe.objects.filter(
+        pk__in=recipe_ids).values_list('id', flat=True))
+    present = set(model.objects.filter(
+        user=user, recipe_id__in=found).values_list('recipe_id', flat=True))
+    added = found - present
+    if added:
+        model.objects.bulk_create(
+            [model(user=user, recipe_id=recipe_id)
+             for recipe_id in sorted(added)],
+            ignore_conflicts=True,
+        )
+        recount_recipes(model, added)
+        if model is ShoppingList:
+            cart_totals.add_recipes(added, [user.pk])
+    return {
+        recipe_id: (ADDED if recipe_id in added
+                    else EXISTS if recipe_id in found else NOT_FOUND)
+        for recipe_id in recipe_ids
+    }
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids=None):
+    """Удаляет рецепты из избранного или корзины пользователя одним DELETE.
+
+    Без ``recipe_ids`` удаляются все рецепты. Возвращает статус для
+    каждого id.
+    """
+    lock_user(user.pk)
+    items = model.objects.filter(user=user)
+    if recipe_ids is not None:
+        items = items.filter(recipe_id__in=recipe_ids)
+    rows = dict(items.values_list('recipe_id', 'id'))
+    removed = set(rows)
+    if removed:
+        if model is ShoppingList:
+            cart_totals.remove_recipes(removed, [user.pk])
+        # Обработчики сигналов удаления обновляют счетчики по одной
+        # строке, поэтому удаляем без них и пересчитываем все разом.
+        delete_pks(model, rows.values())
+        recount_recipes(model, removed)
+    if recipe_ids is None:
+        recipe_ids = sorted(removed)
+    return {
+        recipe_id: REMOVED if recipe_id in removed else MISSING
+        for recipe_id in recipe_ids
+    }
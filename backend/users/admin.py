@@ -4,7 +4,8 @@ from .models import CustomUser, Subscribe
 
 
 class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('email', 'username', 'first_name', 'last_name')
+    list_display = ('email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     search_fields = ('email', 'username')
 
 
@@ -17,6 +17,21 @@ class CustomUser(AbstractUser):
         null=True,
         default=None
     )
+    avatar_variants = models.JSONField(
+        'Варианты аватара',
+        default=dict,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False,
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -28,6 +43,16 @@ class CustomUser(AbstractUser):
     def __str__(self) -> str:
         return self.username
 
+    def refresh_from_db(self, using=None, fields=None):
+        # Пользователь из кэша токенов загружен не целиком (см.
+        # api.authentication): при обращении к первому отложенному полю
+        # дочитываются все остальные одним запросом.
+        if fields is not None:
+            deferred = self.get_deferred_fields()
+            if deferred.intersection(fields):
+                fields = deferred.union(fields)
+        super().refresh_from_db(using, fields)
+
 
 class Subscribe(models.Model):
     user = models.ForeignKey(
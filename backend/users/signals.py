@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend import images
+from backend.counters import change_counter
+
+from .models import CustomUser, Subscribe
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(CustomUser, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(sender, instance, **kwargs):
+    change_counter(CustomUser, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=CustomUser)
+def avatar_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        images.schedule(instance, 'avatar')